@@ -1,46 +1,308 @@
-from fastapi import FastAPI
-from fastapi.responses import FileResponse
-from main import Game
+import asyncio
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Literal
 
-game = Game()
-app = FastAPI()
+import anyio
+from fastapi import Depends, FastAPI, HTTPException, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+from cache import SolutionCache
+from deals import open_index
+from engine import MAX_WORKERS, Game, SearchConfig, SearchStats, shutdown_worker_pools, warm_worker_pool
+from metrics import Metrics, Profiler
+from sessions import SessionRegistry, is_valid_session_id, new_session_id
+
+SESSION_COOKIE = "freecell_session"
+
+# Every browser gets its own game; idle games spill to disk if FREECELL_SESSION_DIR is set
+registry = SessionRegistry(store_dir=os.environ.get("FREECELL_SESSION_DIR"))
+# Solver results shared by all sessions; persisted to SQLite if FREECELL_CACHE_DB is set
+solution_cache = SolutionCache(path=os.environ.get("FREECELL_CACHE_DB"))
+# Precomputed solver results by deal number (python -m deals), if FREECELL_DEAL_INDEX names one;
+# opened on first use or at startup
+deal_index = None
+deal_index_opened = False
+# Request timings and search totals served by /metrics
+metrics = Metrics()
+# Hints run here so CPU-bound searches never block the event loop
+hint_executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 4, thread_name_prefix="hint")
+
+# Weighted A* nodes /computer_play spends on a position the solution cache has not seen before
+# searching it with MCTS; a solution found is cached along its whole line
+COMPUTER_SOLVE_NODES = 300
+
+# Largest rollout depth and rollouts per leaf a request may ask for; a batch of N rollouts
+# holds N boards in NumPy arrays, so it is bounded to keep one request from exhausting memory
+MAX_ROLLOUT_DEPTH = 500
+MAX_ROLLOUT_BATCH = 1024
+
+# The UI files, served from memory: name -> (content, media type, ETag)
+STATIC_FILES = {
+    "index.html": "text/html; charset=utf-8",
+    "styles.css": "text/css; charset=utf-8",
+    "script.js": "text/javascript; charset=utf-8",
+}
+# Browsers may keep a copy but must revalidate it; an unchanged file costs a 304
+STATIC_CACHE_CONTROL = "no-cache"
+static_assets = {}
+
+
+def get_deal_index():
+    global deal_index, deal_index_opened
+    if not deal_index_opened:
+        deal_index = open_index(os.environ.get("FREECELL_DEAL_INDEX"))
+        deal_index_opened = True
+    return deal_index
+
+
+def load_static(name):
+    asset = static_assets.get(name)
+    if asset is None:
+        with open(name, "rb") as f:
+            content = f.read()
+        asset = static_assets[name] = (content, STATIC_FILES[name], f'"{hashlib.sha1(content).hexdigest()}"')
+    return asset
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """
+    Loads the UI files and the deal index before the first request. With FREECELL_WARM_WORKERS
+    set to N, N processes of the shared search pool are started too, so the first parallel search
+    does not wait for them. The pool is shut down on exit.
+    """
+    for name in STATIC_FILES:
+        load_static(name)
+    get_deal_index()
+    workers = int(os.environ.get("FREECELL_WARM_WORKERS", 0))
+    if workers > 1:
+        await asyncio.get_running_loop().run_in_executor(None, warm_worker_pool, workers)
+    yield
+    shutdown_worker_pools()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+class RequestTiming:
+    """
+    Records the status and latency of every request by method and route.
+    Streaming responses are timed until their headers are sent. A plain ASGI middleware
+    rather than @app.middleware, which would hide client disconnects from the endpoints.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        started = False
+
+        def observe(status):
+            # The router stores the matched route in the scope
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            metrics.observe_request(scope["method"], path, status, time.perf_counter() - start)
+
+        async def timed_send(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+                observe(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        except Exception:
+            if not started:
+                observe(500)  # The server error handler outside this middleware answers
+            raise
+
+
+app.add_middleware(RequestTiming)
+
+
+async def get_session(request: Request, response: Response):
+    """
+    Resolves the caller's session from the session cookie, creating one if needed.
+    """
+    session_id = request.cookies.get(SESSION_COOKIE)
+    if not is_valid_session_id(session_id):
+        session_id = new_session_id()
+        response.set_cookie(SESSION_COOKIE, session_id, httponly=True, samesite="lax")
+    return registry.get(session_id)
+
+
+def get_search_config(policy: Literal["random", "greedy", "epsilon_greedy"] = "random", depth: int = 40,
+                      c: float = 1.4, epsilon: float = 0.1, shaped: bool = True, batch: int = 1):
+    """
+    Builds the MCTS settings shared by /computer_play and /hint_stream.
+    Args:
+        policy (str): Rollout policy: "random", "greedy" or "epsilon_greedy".
+        depth (int): Maximum moves per rollout (default 40, at most MAX_ROLLOUT_DEPTH).
+        c (float): UCB exploration constant (default 1.4).
+        epsilon (float): Random move rate of the epsilon_greedy policy (default 0.1).
+        shaped (bool): Reward rollouts for cards sent home, not only for wins (default True).
+        batch (int): Rollouts per leaf; above 1 they run together in the NumPy engine
+            (default 1, at most MAX_ROLLOUT_BATCH).
+    """
+    return SearchConfig(policy, min(max(depth, 0), MAX_ROLLOUT_DEPTH), c, epsilon, shaped,
+                        min(max(batch, 1), MAX_ROLLOUT_BATCH))
+
+
+async def get_game(session=Depends(get_session)):
+    """
+    Yields the session's game while holding the session lock for the duration of the request.
+    """
+    async with session.lock:
+        yield session.game
+    registry.release(session)
+
+
+def static_response(request, name):
+    """
+    A UI file from memory with its ETag, or an empty 304 if the client already has it.
+    """
+    content, media_type, etag = load_static(name)
+    headers = {"ETag": etag, "Cache-Control": STATIC_CACHE_CONTROL}
+    if etag in (tag.strip() for tag in request.headers.get("if-none-match", "").split(",")):
+        return Response(status_code=304, headers=headers)
+    return Response(content, media_type=media_type, headers=headers)
 
 
 @app.get("/")
-async def get_ui():
-    return FileResponse("index.html")
+async def get_ui(request: Request):
+    return static_response(request, "index.html")
 
 
 @app.get("/styles.css")
-async def get_styles():
-    return FileResponse("styles.css")
+async def get_styles(request: Request):
+    return static_response(request, "styles.css")
 
 
 @app.get("/script.js")
-async def get_script():
-    return FileResponse("script.js")
+async def get_script(request: Request):
+    return static_response(request, "script.js")
+
+
+# Number of integer arguments each move type takes after its name
+MOVE_ARITY = {
+    'column_to_column': 2,
+    'column_to_free': 1,
+    'free_to_column': 2,
+    'column_to_home': 1,
+    'free_to_home': 1,
+    'sequence_to_column': 3,
+}
+
+
+class MoveRequest(BaseModel):
+    move: list  # A move as listed by get_possible_moves, e.g. ["column_to_column", 0, 3]
+    auto_home: bool = False
+    since: int = None  # The client's board version; the board is omitted if it has not changed
+
+
+def parse_move(raw):
+    # Returns the move as a tuple, or None if it is not a well-formed move
+    if not raw or raw[0] not in MOVE_ARITY or len(raw) != MOVE_ARITY[raw[0]] + 1:
+        return None
+    args = raw[1:]
+    if not all(isinstance(arg, int) and 0 <= arg < 52 for arg in args):
+        return None
+    # Column and free cell indices must be in range; only a sequence count can exceed 7
+    if not all(arg < 8 for arg in args[:2]):
+        return None
+    return (raw[0],) + tuple(args)
+
+
+def game_payload(game, since=None):
+    """
+    Everything the client needs after an action: board version, win flag, legal moves and,
+    unless the client's version is already current, the board itself.
+    """
+    started = bool(game.table)
+    payload = {
+        "version": game.version,
+        "won": started and game.is_game_won(),
+        "moves": game.get_possible_moves() if started else [],
+    }
+    if since != game.version:
+        payload.update({"table": game.table, "free": game.free, "home": game.home})
+    return payload
 
 
 # New endpoint to get the current game state
 @app.get("/get_game_state")
-async def get_game_state_api():
+async def get_game_state_api(since: int = None, game: Game = Depends(get_game)):
     """
-    Returns the current state of the game board, including table, free cells, and home cells.
+    Returns the current state of the game board, including table, free cells, and home cells,
+    along with its version, win flag and legal moves.
+    Args:
+        since (int): Optional board version the client already has; the board is omitted if unchanged.
     """
-    return {"table": game.table, "free": game.free, "home": game.home}
+    return game_payload(game, since)
 
 
 @app.post("/start")
-async def start():
+async def start(seed: int = None, deal_number: int = None, difficulty: Literal["easy", "medium", "hard"] = None,
+                game: Game = Depends(get_game)):
     """
     Starts a new FreeCell game.
+    A deal found in the deal index seeds the solution cache with its known solution, so
+    /computer_play answers along it without searching.
+    Args:
+        seed (int): Optional seed for a reproducible shuffle, or for the choice of deal with difficulty.
+        deal_number (int): Optional Microsoft FreeCell deal number (takes precedence over seed).
+        difficulty (str): Deal a solvable deal of this difficulty from the deal index:
+            "easy", "medium" or "hard" (404 without an index holding such deals).
+    Returns:
+        dict: The new game state (see get_game_state) plus "deal": the deal's number, status,
+            difficulty, solution length and solver nodes, or None if it is not indexed.
     """
-    game.start()
-    # No return value needed, as the frontend will call get_game_state to refresh
+    deal_index = get_deal_index()
+    if difficulty is not None and deal_number is None:
+        rng = random.Random(seed) if seed is not None else game.rng
+        deal_number = deal_index.random_deal(difficulty, rng) if deal_index is not None else None
+        if deal_number is None:
+            raise HTTPException(404, f"No indexed {difficulty} deals")
+    game.start(seed=seed, deal_number=deal_number)
+    info = deal_index.lookup(deal_number) if deal_index is not None and deal_number is not None else None
+    if info is not None:
+        solution = deal_index.solution(deal_number)
+        if solution:
+            solution_cache.store_line(game.to_board(), solution)
+    return {**game_payload(game), "deal": info._asdict() if info is not None else None}
+
+
+@app.post("/move")
+async def move(request: MoveRequest, game: Game = Depends(get_game)):
+    """
+    Applies any move type from get_possible_moves in a single round trip.
+    Args:
+        request (MoveRequest): The move, whether to auto-play safe cards home afterwards,
+            and the client's board version.
+    Returns:
+        dict: "ok" (whether the move was legal) plus the resulting game state.
+    """
+    parsed = parse_move(request.move)
+    ok = parsed is not None and game.table and game.apply_move(parsed) is not None
+    if ok and request.auto_home:
+        game.auto_play()
+    return {"ok": bool(ok), **game_payload(game, request.since)}
 
 
 @app.get("/is_game_won")
-async def is_game_won():
+async def is_game_won(game: Game = Depends(get_game)):
     """
     Checks if the current game has been won.
     """
@@ -48,86 +310,263 @@ async def is_game_won():
 
 
 @app.post("/move_column")
-async def move_column(src: int, dst: int):
+async def move_column(src: int, dst: int, count: int = 1, auto_home: bool = False,
+                      game: Game = Depends(get_game)):
     """
-    Moves a card from a source column to a destination column.
+    Moves a card, or an ordered run of cards, from a source column to a destination column.
     Args:
         src (int): The index of the source column (0-7).
         dst (int): The index of the destination column (0-7).
+        count (int): Number of cards to move from the top of the source column (default 1; a count below 1 is rejected).
+        auto_home (bool): Afterwards, send every provably safe card to its HomeCell.
     Returns:
         bool: True if the move was successful, False otherwise.
     """
-    return game.move_column(src, dst)
+    moved = game.move_column(src, dst, count)
+    if moved and auto_home:
+        game.auto_play()
+    return moved
 
 
 @app.post("/move_to_free")
-async def move_to_free(src: int):
+async def move_to_free(src: int, auto_home: bool = False, game: Game = Depends(get_game)):
     """
     Moves a card from a column to a FreeCell.
     Args:
         src (int): The index of the source column (0-7).
+        auto_home (bool): Afterwards, send every provably safe card to its HomeCell.
     Returns:
         bool: True if the move was successful, False otherwise.
     """
-    return game.move_to_free(src)
+    moved = game.move_to_free(src)
+    if moved and auto_home:
+        game.auto_play()
+    return moved
 
 
 @app.post("/move_from_free")
-async def move_from_free(src: int, dst: int):
+async def move_from_free(src: int, dst: int, auto_home: bool = False,
+                         game: Game = Depends(get_game)):
     """
     Moves a card from a FreeCell to a column.
     Args:
         src (int): The index of the source FreeCell (0-3).
         dst (int): The index of the destination column (0-7).
+        auto_home (bool): Afterwards, send every provably safe card to its HomeCell.
     Returns:
         bool: True if the move was successful, False otherwise.
     """
-    return game.move_from_free(src, dst)
+    moved = game.move_from_free(src, dst)
+    if moved and auto_home:
+        game.auto_play()
+    return moved
 
 
 @app.post("/column_to_home")
-async def column_to_home(src: int):
+async def column_to_home(src: int, auto_home: bool = False, game: Game = Depends(get_game)):
     """
     Moves a card from a column to its appropriate HomeCell.
     Args:
         src (int): The index of the source column (0-7).
+        auto_home (bool): Afterwards, send every provably safe card to its HomeCell.
     Returns:
         bool: True if the move was successful, False otherwise.
     """
-    return game.column_to_home(src)
+    moved = game.column_to_home(src)
+    if moved and auto_home:
+        game.auto_play()
+    return moved
 
 
 @app.post("/free_to_home")
-async def free_to_home(src: int):
+async def free_to_home(src: int, auto_home: bool = False, game: Game = Depends(get_game)):
     """
     Moves a card from a FreeCell to its appropriate HomeCell.
     Args:
         src (int): The index of the source FreeCell (0-3).
+        auto_home (bool): Afterwards, send every provably safe card to its HomeCell.
     Returns:
         bool: True if the move was successful, False otherwise.
     """
-    return game.free_to_home(src)
+    moved = game.free_to_home(src)
+    if moved and auto_home:
+        game.auto_play()
+    return moved
+
+
+async def run_hint(request, search):
+    """
+    Runs search(should_stop) in the hint executor, cancelling it if the client disconnects.
+    """
+    cancel = threading.Event()
+    future = asyncio.get_running_loop().run_in_executor(hint_executor, search, cancel.is_set)
+    while True:
+        done, _ = await asyncio.wait({future}, timeout=0.1)
+        if done:
+            return future.result()
+        if not cancel.is_set() and await request.is_disconnected():
+            cancel.set()
 
 
 @app.get("/computer_play")
-async def computer_play(sim: int = 100):
+async def computer_play(request: Request, sim: int = None, time_ms: int = None, workers: int = 1, seed: int = None,
+                        since: int = None, stats: bool = False, debug: bool = False,
+                        config: SearchConfig = Depends(get_search_config), game: Game = Depends(get_game)):
     """
     Instructs the computer to make a move using MCTS.
+    The search runs off the event loop and stops early if the client disconnects.
+    Rollout policy, rollout depth and the UCB constant come from get_search_config.
     Args:
-        sim (int): Number of simulations for the Monte Carlo Tree Search.
+        sim (int): Number of simulations for the Monte Carlo Tree Search (default 100 without time_ms).
+        time_ms (int): Wall-clock budget in milliseconds; the best move found in time is played.
+        workers (int): Number of worker processes sharing the simulations (default 1, at most
+            the number of CPUs). A parallel search stops at the next finished worker once the
+            client disconnects.
+        seed (int): Optional seed that makes the chosen move reproducible.
+        since (int): Optional board version the client already has.
+        stats (bool): Include the search statistics (nodes, rollouts, time per phase, tree shape).
+        debug (bool): Run the search under cProfile and include the report.
     Returns:
-        tuple or None: The best move found (e.g., ('column_to_column', src, dst)) or None if no move found.
+        dict: "move", the move made (e.g., ('column_to_column', src, dst)) or None if no move was found,
+            "played", that move followed by the cards it let go home (one undo step),
+            plus the resulting game state, and "stats" / "profile" when requested.
+    """
+    workers = max(1, min(workers, MAX_WORKERS))
+    search_stats = SearchStats()
+    profiler = Profiler() if debug else None
+
+    # The computer_play method in engine.py already applies the move internally
+    # Parallel searches share the long-lived process pool kept in engine.py
+    # Positions on a cached solution line are answered without searching; new positions get a
+    # short solver attempt first, which fills the cache for everyone
+    def play(should_stop):
+        return game.computer_play(sim, workers=workers, seed=seed, time_ms=time_ms, should_stop=should_stop,
+                                  cache=solution_cache, config=config, stats=search_stats,
+                                  solve_nodes=COMPUTER_SOLVE_NODES)
+
+    if profiler is not None:
+        best_move = await run_hint(request, lambda should_stop: profiler.call(play, should_stop))
+    else:
+        best_move = await run_hint(request, play)
+    if search_stats.rollouts:
+        metrics.observe_search(search_stats)
+
+    # The move plus the safe-to-home closure played with it, which one undo reverts
+    played = game.last_step() if best_move is not None else []
+    response = {"move": best_move, "played": played, **game_payload(game, since)}
+    if stats:
+        response["stats"] = search_stats.as_dict()
+    if profiler is not None:
+        response["profile"] = profiler.report()
+    return response
+
+
+@app.get("/hint_stream")
+async def hint_stream(request: Request, sim: int = None, time_ms: int = None, every: int = 50,
+                      stats: bool = False, debug: bool = False, config: SearchConfig = Depends(get_search_config),
+                      session=Depends(get_session)):
+    """
+    Streams an anytime hint as Server-Sent Events without playing it.
+    Each event carries the current best move with its visits, wins and the simulations run
+    so far; a final "done" event ends the stream. Closing the connection stops the search.
+    Accepts the same search settings as /computer_play.
+    Args:
+        sim (int): Maximum number of simulations (default 100 without time_ms).
+        time_ms (int): Wall-clock budget in milliseconds.
+        every (int): Simulations between updates (default 50).
+        stats (bool): Include the search statistics so far in every event.
+        debug (bool): Profile the search with cProfile and send the report as a final "profile" event.
+    """
+    search_stats = SearchStats()
+    profiler = Profiler() if debug else None
+
+    async def events():
+        loop = asyncio.get_running_loop()
+        cancel = threading.Event()
+        pending = None  # The executor call running the search, if any
+        async with session.lock:
+            updates = session.game.hint_stream(sim, time_ms=time_ms, report_every=every, should_stop=cancel.is_set,
+                                               config=config, stats=search_stats)
+            try:
+                while True:
+                    if await request.is_disconnected():
+                        break
+                    if profiler is not None:
+                        pending = loop.run_in_executor(hint_executor, profiler.call, next, updates, None)
+                    else:
+                        pending = loop.run_in_executor(hint_executor, next, updates, None)
+                    # Shielded so a disconnect cannot mark the call done while its thread still runs
+                    update = await asyncio.shield(pending)
+                    if update is None:
+                        break
+                    if stats:
+                        update["stats"] = search_stats.as_dict()
+                    yield f"data: {json.dumps(update)}\n\n"
+            finally:
+                cancel.set()
+                if pending is not None:
+                    # The thread still holds the session's search tree; keep the lock until it stops
+                    with anyio.CancelScope(shield=True):
+                        await asyncio.wait({pending})
+                registry.release(session)
+        if search_stats.rollouts:
+            metrics.observe_search(search_stats)
+        if profiler is not None:
+            yield f"event: profile\ndata: {json.dumps({'profile': profiler.report()})}\n\n"
+        yield "event: done\ndata: {}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.get("/cache_stats")
+async def cache_stats():
+    """
+    Returns the solution cache size and its hit, miss and eviction counters.
+    """
+    return solution_cache.stats()
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """
+    Returns request counts and latencies per route, MCTS search totals, and session and
+    solution cache gauges in the Prometheus text exposition format.
     """
-    # The computer_play method in main.py already applies the move internally
-    # So we just need to call it and return its result (the move made or None)
-    return game.computer_play(sim)
+    sessions = registry.stats()
+    cache = solution_cache.stats()
+    deal_index = get_deal_index()
+    gauges = {
+        "freecell_sessions": ("Live sessions", sessions["sessions"]),
+        "freecell_session_bytes": ("Estimated bytes held by live sessions", sessions["total_bytes"]),
+        "freecell_cache_entries": ("Solution cache entries", cache["entries"]),
+        "freecell_indexed_deals": ("Deals in the deal index", len(deal_index) if deal_index is not None else 0),
+    }
+    counters = {
+        "freecell_session_evictions_total": ("Sessions evicted since startup", sessions["evictions"]),
+        "freecell_session_rehydrations_total": ("Sessions restored from disk since startup", sessions["rehydrations"]),
+        "freecell_cache_hits_total": ("Solution cache hits since startup", cache["hits"]),
+        "freecell_cache_misses_total": ("Solution cache misses since startup", cache["misses"]),
+        "freecell_cache_evictions_total": ("Solution cache entries evicted since startup", cache["evictions"]),
+    }
+    return PlainTextResponse(metrics.render(gauges, counters), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/session_stats")
+async def session_stats():
+    """
+    Returns the number of live sessions, their estimated memory use and eviction counters.
+    """
+    return registry.stats()
 
 
 @app.post("/undo")
-async def undo():
+async def undo(since: int = None, game: Game = Depends(get_game)):
     """
     Undoes the last game move.
+    Args:
+        since (int): Optional board version the client already has.
     Returns:
-        bool: True if undo was successful, False otherwise.
+        dict: "ok" (True if undo was successful, False otherwise) plus the resulting game state.
     """
-    return game.undo()
+    ok = game.undo()
+    return {"ok": ok, **game_payload(game, since)}
@@ -0,0 +1,213 @@
+"""
+Headless batch runner: deals numbered games, solves or autoplays each one and streams
+one JSON line per deal as it finishes.
+
+    python -m batch --deals 1-32000 --workers 16 --out results.jsonl
+
+Deals already present in the output file are skipped, so an interrupted run can be
+resumed with the same command.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from multiprocessing import Pool
+
+from engine import ROLLOUT_POLICIES, SearchConfig, SearchStats, deal_game
+import solver
+
+
+def parse_deals(spec):
+    # "1-100,250,300-310" -> [1, ..., 100, 250, 300, ..., 310]
+    deals = []
+    for part in spec.split(","):
+        if "-" in part:
+            first, last = part.split("-")
+            deals.extend(range(int(first), int(last) + 1))
+        elif part:
+            deals.append(int(part))
+    return deals
+
+
+def peak_rss_kb():
+    # High-water RSS of this process from /proc (Linux). Unlike ru_maxrss, it starts over
+    # in a new program instead of carrying the parent's peak across exec.
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1])
+    raise OSError("VmHWM is not reported")
+
+
+def reset_peak_rss():
+    # Starts VmHWM over from the current RSS (Linux), so the next reading is the peak since now
+    with open("/proc/self/clear_refs", "w") as f:
+        f.write("5")
+
+
+def play_deal(number, options):
+    # Solves or autoplays one deal; returns (solved, exhausted, moves, cards home, nodes)
+    game = deal_game(number)
+    if options["mode"] in ("solve", "beam"):
+        board = game.to_board()
+        if options["mode"] == "beam":
+            result = solver.beam_solve(board, options["beam_width"], options["memory_mb"], options["max_nodes"],
+                                       options["time_limit"])
+        else:
+            result = solver.solve(board, max_nodes=options["max_nodes"], time_limit=options["time_limit"])
+        moves = game.translate_moves(board, result.moves) if result.solved else []
+        return result.solved, result.exhausted, moves, result.best_home, result.nodes
+
+    # MCTS autoplay until the game is won, stuck or out of moves. The history holds the
+    # safe-to-home moves computer_play makes after its own, so the move list replays.
+    config = SearchConfig(options["policy"], options["rollout_depth"], options["c_param"],
+                          shaped=options["shaped"])
+    stats = SearchStats()
+    game.record_history = True
+    searches = 0
+    while len(game.history_moves()) < options["max_moves"] and not game.is_game_won():
+        if game.computer_play(options["sim"], seed=number * 1000 + searches, config=config, stats=stats) is None:
+            break
+        searches += 1
+    moves = game.history_moves()
+    return game.is_game_won(), False, moves, game.to_board().cards_home(), stats.nodes_created
+
+
+def run_deal(number, options):
+    try:
+        reset_peak_rss()
+    except OSError:
+        pass  # Then peak_rss_kb is the worker's peak so far, an upper bound for this deal
+    start = time.perf_counter()
+    solved, exhausted, moves, cards_home, nodes = play_deal(number, options)
+    elapsed = time.perf_counter() - start
+    try:
+        peak_rss = peak_rss_kb()
+    except OSError:
+        peak_rss = None  # No /proc on this platform
+
+    record = {
+        "deal": number,
+        "mode": options["mode"],
+        "solved": solved,
+        "exhausted": exhausted,
+        "moves": len(moves),
+        "cards_home": cards_home,
+        "nodes": nodes,
+        "seconds": round(elapsed, 4),
+        "peak_rss_kb": peak_rss,
+    }
+    if options["trace_memory"]:
+        # The precise Python-level peak from a second, traced run: tracemalloc slows the
+        # solver several times over, so the timed run above goes without it
+        tracemalloc.start()
+        try:
+            play_deal(number, options)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        record["peak_kb"] = peak // 1024
+    if options["solutions"] and solved:
+        record["solution"] = moves
+    return record
+
+
+def _run_deal_star(job):
+    return run_deal(*job)
+
+
+def completed_deals(path):
+    # Deals already written by an earlier run; a truncated last line is ignored
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path) as f:
+        for line in f:
+            try:
+                done.add(json.loads(line)["deal"])
+            except (ValueError, KeyError):
+                continue
+    return done
+
+
+def drop_partial_line(path):
+    # An interrupted run can leave half a record at the end of the file; cut it off so the
+    # next record starts on a line of its own
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+
+
+def run_batch(deals, options, out_path, workers=1):
+    drop_partial_line(out_path)
+    done = completed_deals(out_path)
+    jobs = [(number, options) for number in deals if number not in done]
+    solved = 0
+    with open(out_path, "a") as out:
+        if workers > 1:
+            pool = Pool(workers)
+            results = pool.imap_unordered(_run_deal_star, jobs)
+        else:
+            pool = None
+            results = map(_run_deal_star, jobs)
+        try:
+            for record in results:
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+                solved += record["solved"]
+        finally:
+            if pool is not None:
+                pool.terminate()
+    return len(jobs), solved
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Solve or autoplay many numbered FreeCell deals.")
+    parser.add_argument("--deals", default="1-100", help="Deal numbers, e.g. 1-32000 or 1-10,42")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--out", default="results.jsonl", help="JSONL output file (appended, resumable)")
+    parser.add_argument("--mode", choices=["solve", "beam", "mcts"], default="solve",
+                        help="A* solver, memory-bounded beam solver, or MCTS autoplay")
+    parser.add_argument("--max-nodes", type=int, default=200000, help="Solver node budget per deal")
+    parser.add_argument("--time-limit", type=float, default=None, help="Solver time limit per deal (seconds)")
+    parser.add_argument("--beam-width", type=int, default=solver.BEAM_WIDTH, help="Beam solver positions per depth")
+    parser.add_argument("--memory-mb", type=float, default=None, help="Beam solver memory ceiling in megabytes")
+    parser.add_argument("--sim", type=int, default=100, help="MCTS simulations per move")
+    parser.add_argument("--max-moves", type=int, default=300, help="MCTS autoplay move limit per deal")
+    parser.add_argument("--policy", choices=sorted(ROLLOUT_POLICIES), default="random",
+                        help="MCTS rollout policy")
+    parser.add_argument("--rollout-depth", type=int, default=40, help="MCTS moves per rollout")
+    parser.add_argument("--c-param", type=float, default=1.4, help="MCTS UCB exploration constant")
+    parser.add_argument("--binary-reward", action="store_true",
+                        help="Reward MCTS rollouts only for wins, not for cards sent home")
+    parser.add_argument("--solutions", action="store_true", help="Include the move list of solved deals")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Run each deal a second time under tracemalloc and record its peak memory")
+    args = parser.parse_args(argv)
+
+    options = {
+        "mode": args.mode,
+        "max_nodes": args.max_nodes,
+        "time_limit": args.time_limit,
+        "beam_width": args.beam_width,
+        "memory_mb": args.memory_mb,
+        "sim": args.sim,
+        "max_moves": args.max_moves,
+        "policy": args.policy,
+        "rollout_depth": args.rollout_depth,
+        "c_param": args.c_param,
+        "shaped": not args.binary_reward,
+        "solutions": args.solutions,
+        "trace_memory": args.trace_memory,
+    }
+    ran, solved = run_batch(parse_deals(args.deals), options, args.out, args.workers)
+    print(f"Ran {ran} deals, solved {solved}.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
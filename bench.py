@@ -0,0 +1,486 @@
+"""
+Benchmark harness: times move generation, rollouts, MCTS, the solver and the HTTP API on
+a fixed set of Microsoft-numbered deals and writes the numbers as JSON.
+
+    python -m bench --out bench.json
+    python -m bench --baseline bench.json --out new.json
+
+With --baseline, every metric is compared against the stored run and the exit status is 1
+when any of them got worse by more than --tolerance.
+"""
+import argparse
+import contextlib
+import http.client
+import json
+import multiprocessing
+import platform
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+import tracemalloc
+
+from engine import Game, MCTSNode, SearchConfig, deal_game, search
+from batch import parse_deals, peak_rss_kb
+import solver
+
+SECTIONS = ("movegen", "rollouts", "vector", "mcts", "solver", "http", "startup", "load")
+
+# RSS a memory-bounded search may use beyond its ceiling: allocator arenas and interpreter
+# state that the solver's own estimate does not see
+RSS_ALLOWANCE_KB = 2048
+
+
+def sample_positions(deals, walk=60, seed=0):
+    # Positions along a seeded random walk from each deal, so move generation sees
+    # openings, middle games and crowded boards alike
+    rng = random.Random(seed)
+    positions = []
+    for number in deals:
+        board = deal_game(number).to_board()
+        for _ in range(walk):
+            positions.append(board)
+            moves = board.legal_moves()
+            if not moves:
+                break
+            board, _ = board.play_closed(rng.choice(moves))
+    return positions
+
+
+def higher_is_better(name):
+    return name.endswith(("_per_sec", "solve_rate", "reward"))
+
+
+def peak_kb(fn):
+    # Peak traced allocation of one call; run apart from the timings it would slow down
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak // 1024
+
+
+def _rss_growth_child(conn, fn, args):
+    before = peak_rss_kb()
+    fn(*args)
+    conn.send(peak_rss_kb() - before)
+
+
+def rss_growth_kb(fn, *args):
+    # Growth of peak RSS in KB while fn(*args) runs in a freshly spawned interpreter, so
+    # peaks of this process do not hide it; fn must be module-level
+    context = multiprocessing.get_context("spawn")
+    receiver, sender = context.Pipe(duplex=False)
+    child = context.Process(target=_rss_growth_child, args=(sender, fn, args))
+    child.start()
+    sender.close()  # Only the child's end stays open, so its exit ends the pipe
+    try:
+        growth = receiver.recv()
+    except EOFError:
+        growth = None
+    child.join()
+    if growth is None or child.exitcode != 0:
+        raise RuntimeError(f"RSS measurement child failed with exit code {child.exitcode}")
+    return growth
+
+
+def bench_movegen(deals, options):
+    positions = sample_positions(deals)
+    repeat = options["repeat"]
+
+    start = time.perf_counter()
+    generated = 0
+    for _ in range(repeat):
+        for board in positions:
+            generated += len(board.legal_moves())
+    board_seconds = time.perf_counter() - start
+
+    # The same positions through the list-based Game, plus an apply/unapply round trip per move
+    game = Game(record_history=False)
+    game_generated = 0
+    game_seconds = 0.0
+    round_trips = 0
+    round_trip_seconds = 0.0
+    for board in positions:
+        game.load_board(board)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            moves = game.get_possible_moves()
+        game_seconds += time.perf_counter() - start
+        game_generated += len(moves) * repeat
+        start = time.perf_counter()
+        for move in moves:
+            game.unapply_move(move, game.apply_move(move))
+        round_trip_seconds += time.perf_counter() - start
+        round_trips += len(moves)
+
+    return {
+        "positions": len(positions),
+        "board_moves_per_sec": generated / board_seconds,
+        "board_calls_per_sec": len(positions) * repeat / board_seconds,
+        "game_moves_per_sec": game_generated / game_seconds,
+        "apply_undo_per_sec": round_trips / round_trip_seconds,
+    }
+
+
+def bench_rollouts(deals, options):
+    config = options["config"]
+    rng = random.Random(1)
+    nodes = [MCTSNode(deal_game(number).to_board()) for number in deals]
+    rollouts = options["rollouts"]
+    start = time.perf_counter()
+    reward = 0
+    for node in nodes:
+        for _ in range(rollouts):
+            reward += node.simulate(rng, config)
+    elapsed = time.perf_counter() - start
+    return {
+        "rollouts_per_sec": len(nodes) * rollouts / elapsed,
+        "mean_reward": reward / (len(nodes) * rollouts),
+    }
+
+
+def bench_vector(deals, options):
+    # The NumPy engine is optional; without NumPy this section reports nothing
+    try:
+        import vector
+    except ImportError:
+        print("vector: NumPy is not installed, skipped", file=sys.stderr)
+        return {}
+    # Its rules must agree with Board and Game before its speed means anything
+    checked = vector.self_check(sample_positions(deals, walk=20), steps=20)
+
+    config = options["config"]
+    batch = options["vector_batch"]
+    boards = [deal_game(number).to_board() for number in deals]
+    rollouts = 0
+    start = time.perf_counter()
+    while rollouts < options["rollouts"] * len(deals):
+        for board in boards:
+            vector.rollouts(board, batch, rollouts, config)
+            rollouts += batch
+    elapsed = time.perf_counter() - start
+    return {
+        "positions_checked": checked,
+        "rollouts_per_sec": rollouts / elapsed,
+    }
+
+
+def bench_mcts(deals, options):
+    config = options["config"]
+    results = {}
+    for budget in options["budgets"]:
+        start = time.perf_counter()
+        for number in deals:
+            search(MCTSNode(deal_game(number).to_board()), budget, random.Random(number), config=config)
+        elapsed = time.perf_counter() - start
+        results[f"sims_{budget}_per_sec"] = budget * len(deals) / elapsed
+    largest = max(options["budgets"])
+    board = deal_game(deals[0]).to_board()
+    results["peak_kb"] = peak_kb(lambda: search(MCTSNode(board), largest, random.Random(0), config=config))
+    return results
+
+
+def bench_solver(deals, options):
+    solved = 0
+    nodes = 0
+    start = time.perf_counter()
+    for number in deals:
+        result = solver.solve(deal_game(number).to_board(), max_nodes=options["max_nodes"])
+        solved += result.solved
+        nodes += result.nodes
+    elapsed = time.perf_counter() - start
+    board = deal_game(deals[0]).to_board()
+    results = {
+        "solve_rate": solved / len(deals),
+        "seconds_per_deal": elapsed / len(deals),
+        "nodes_per_sec": nodes / elapsed,
+        "peak_kb": peak_kb(lambda: solver.solve(board, max_nodes=options["max_nodes"])),
+    }
+
+    # The memory-bounded beam search, whose peak memory must stay under its ceiling
+    ceiling = options["beam_memory_mb"]
+    solved = 0
+    cards_home = 0
+    start = time.perf_counter()
+    for number in deals:
+        result = solver.beam_solve(deal_game(number).to_board(), memory_mb=ceiling, max_nodes=options["max_nodes"])
+        solved += result.solved
+        cards_home += result.best_home
+    elapsed = time.perf_counter() - start
+    results.update({
+        "beam_solve_rate": solved / len(deals),
+        "beam_cards_home_reward": cards_home / len(deals),
+        "beam_seconds_per_deal": elapsed / len(deals),
+        "beam_peak_kb": peak_kb(lambda: solver.beam_solve(board, memory_mb=ceiling, max_nodes=options["max_nodes"])),
+        "beam_rss_growth_kb": rss_growth_kb(solver.beam_solve, board, solver.BEAM_WIDTH, ceiling,
+                                            options["max_nodes"]),
+    })
+    if results["beam_peak_kb"] > ceiling * 1024:
+        raise AssertionError(f"beam_solve allocated {results['beam_peak_kb']} KB, over its {ceiling} MB ceiling")
+    if results["beam_rss_growth_kb"] > ceiling * 1024 + RSS_ALLOWANCE_KB:
+        raise AssertionError(f"beam_solve grew RSS by {results['beam_rss_growth_kb']} KB, "
+                             f"over its {ceiling} MB ceiling")
+    return results
+
+
+def bench_http(deals, options):
+    # FastAPI is only needed for this section
+    from fastapi.testclient import TestClient
+    import app
+
+    client = TestClient(app.app)
+    latencies = {}
+
+    def timed(name, method, url, **kwargs):
+        start = time.perf_counter()
+        response = client.request(method, url, **kwargs)
+        latencies.setdefault(name, []).append(time.perf_counter() - start)
+        response.raise_for_status()
+        return response.json()
+
+    start = time.perf_counter()
+    requests = 0
+    for number in deals:
+        state = timed("start", "POST", f"/start?deal_number={number}")
+        for _ in range(options["http_moves"]):
+            if not state["moves"]:
+                break
+            state = timed("move", "POST", "/move", json={"move": state["moves"][0], "since": state["version"]})
+            timed("get_game_state", "GET", f"/get_game_state?since={state['version']}")
+            requests += 2
+        timed("computer_play", "GET", "/computer_play?sim=20&seed=1")
+        requests += 2
+    elapsed = time.perf_counter() - start
+
+    results = {"requests_per_sec": requests / elapsed}
+    for name, samples in latencies.items():
+        samples.sort()
+        results[f"{name}_p50_ms"] = 1000 * samples[len(samples) // 2]
+        results[f"{name}_p95_ms"] = 1000 * samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    return results
+
+
+def import_ms(module, runs=5):
+    # Best wall time of a fresh interpreter importing module, less a bare interpreter's
+    def best(code):
+        times = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", code], check=True)
+            times.append(time.perf_counter() - start)
+        return min(times)
+    return 1000 * (best(f"import {module}") - best("pass"))
+
+
+@contextlib.contextmanager
+def running_server():
+    # Launches uvicorn on a free port and yields (port, milliseconds to its first answer)
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "app:app", "--port", str(port)],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            if server.poll() is not None:
+                raise RuntimeError("uvicorn exited before serving a request")
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1).read()
+                break
+            except OSError:
+                time.sleep(0.01)
+        yield port, 1000 * (time.perf_counter() - start)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def bench_startup(deals, options):
+    results = {
+        "engine_import_ms": import_ms("engine"),
+        "app_import_ms": import_ms("app"),
+    }
+    # Cold start of the server to its first answered request
+    with running_server() as (_, first_response_ms):
+        results["first_response_ms"] = first_response_ms
+    return results
+
+
+class _Client:
+    # One keep-alive connection with its own session cookie
+    def __init__(self, port):
+        self.connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        self.cookie = None
+
+    def request(self, method, url):
+        headers = {"Cookie": self.cookie} if self.cookie else {}
+        self.connection.request(method, url, headers=headers)
+        response = self.connection.getresponse()
+        body = response.read()
+        if response.status >= 400:
+            raise RuntimeError(f"{method} {url}: HTTP {response.status}")
+        cookie = response.getheader("set-cookie")
+        if cookie:
+            self.cookie = cookie.split(";")[0]
+        return body
+
+
+def bench_load(deals, options):
+    """
+    Latency of cheap requests while --load-clients sessions keep the server busy with
+    /computer_play searches of --load-time-ms each, measured against a real uvicorn server
+    for --load-seconds.
+    """
+    stop = threading.Event()
+    hints = []
+    errors = []
+
+    def hint_client(port, number):
+        client = _Client(port)
+        try:
+            client.request("POST", f"/start?deal_number={number}")
+            while not stop.is_set():
+                state = json.loads(client.request("GET", f"/computer_play?time_ms={options['load_time_ms']}"))
+                hints.append(1)
+                if state["move"] is None or state["won"]:
+                    client.request("POST", f"/start?deal_number={number}")
+        except Exception as error:
+            errors.append(error)
+
+    latencies = {"get_game_state": [], "static": []}
+    with running_server() as (port, _):
+        threads = [threading.Thread(target=hint_client, args=(port, deals[i % len(deals)]))
+                   for i in range(options["load_clients"])]
+        for thread in threads:
+            thread.start()
+        probe = _Client(port)
+        probe.request("POST", f"/start?deal_number={deals[0]}")
+        start = time.perf_counter()
+        while time.perf_counter() - start < options["load_seconds"]:
+            for name, url in (("get_game_state", "/get_game_state"), ("static", "/styles.css")):
+                sent = time.perf_counter()
+                probe.request("GET", url)
+                latencies[name].append(time.perf_counter() - sent)
+            time.sleep(0.01)
+        elapsed = time.perf_counter() - start
+        stop.set()
+        for thread in threads:
+            thread.join()
+    if errors:
+        raise errors[0]
+
+    results = {"hints_per_sec": len(hints) / elapsed}
+    for name, samples in latencies.items():
+        samples.sort()
+        results[f"{name}_p50_ms"] = 1000 * samples[len(samples) // 2]
+        results[f"{name}_p99_ms"] = 1000 * samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    return results
+
+
+BENCHMARKS = {
+    "movegen": bench_movegen,
+    "rollouts": bench_rollouts,
+    "vector": bench_vector,
+    "mcts": bench_mcts,
+    "solver": bench_solver,
+    "http": bench_http,
+    "startup": bench_startup,
+    "load": bench_load,
+}
+
+
+def run_benchmarks(deals, options, sections=SECTIONS):
+    report = {
+        "deals": deals,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "metrics": {},
+    }
+    for section in sections:
+        start = time.perf_counter()
+        results = BENCHMARKS[section](deals, options)
+        print(f"{section}: {time.perf_counter() - start:.1f}s", file=sys.stderr)
+        for name, value in results.items():
+            report["metrics"][f"{section}.{name}"] = round(value, 4) if isinstance(value, float) else value
+    return report
+
+
+def compare(report, baseline, tolerance):
+    """
+    Returns (rows, regressions): one row per metric present in both runs with its relative
+    change, and the names of metrics that got worse by more than tolerance.
+    """
+    rows = []
+    regressions = []
+    for name, value in report["metrics"].items():
+        old = baseline["metrics"].get(name)
+        if not old or not isinstance(value, (int, float)):
+            continue
+        change = (value - old) / old
+        worse = -change if higher_is_better(name) else change
+        rows.append((name, old, value, change))
+        if worse > tolerance:
+            regressions.append(name)
+    return rows, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark move generation, search, the solver and the API.")
+    parser.add_argument("--deals", default="1-5", help="Deal numbers, e.g. 1-5 or 1,7,42")
+    parser.add_argument("--only", default=",".join(SECTIONS), help="Comma-separated sections to run")
+    parser.add_argument("--out", default=None, help="Write the JSON report here")
+    parser.add_argument("--baseline", default=None, help="Earlier JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed relative regression (default 0.1)")
+    parser.add_argument("--repeat", type=int, default=20, help="Move generation passes over the sampled positions")
+    parser.add_argument("--rollouts", type=int, default=200, help="Rollouts per deal")
+    parser.add_argument("--vector-batch", type=int, default=256, help="Boards per NumPy rollout batch")
+    parser.add_argument("--budgets", default="50,200", help="MCTS simulation budgets")
+    parser.add_argument("--max-nodes", type=int, default=20000, help="Solver node budget per deal")
+    parser.add_argument("--beam-memory-mb", type=float, default=4, help="Memory ceiling of the beam solver")
+    parser.add_argument("--http-moves", type=int, default=20, help="Moves played through /move per deal")
+    parser.add_argument("--load-clients", type=int, default=4, help="Sessions running searches in the load section")
+    parser.add_argument("--load-time-ms", type=int, default=200, help="Search time of each load-section search")
+    parser.add_argument("--load-seconds", type=float, default=5, help="Duration of the load section")
+    args = parser.parse_args(argv)
+
+    options = {
+        "config": SearchConfig(),
+        "repeat": args.repeat,
+        "rollouts": args.rollouts,
+        "vector_batch": args.vector_batch,
+        "budgets": [int(budget) for budget in args.budgets.split(",")],
+        "max_nodes": args.max_nodes,
+        "beam_memory_mb": args.beam_memory_mb,
+        "http_moves": args.http_moves,
+        "load_clients": args.load_clients,
+        "load_time_ms": args.load_time_ms,
+        "load_seconds": args.load_seconds,
+    }
+    sections = [section for section in args.only.split(",") if section]
+    report = run_benchmarks(parse_deals(args.deals), options, sections)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    if not args.baseline:
+        print(json.dumps(report["metrics"], indent=2))
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    rows, regressions = compare(report, baseline, args.tolerance)
+    for name, old, new, change in rows:
+        flag = "  REGRESSION" if name in regressions else ""
+        print(f"{name:40} {old:>14.4f} {new:>14.4f} {change:>+8.1%}{flag}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
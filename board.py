@@ -0,0 +1,337 @@
+import random
+from collections import namedtuple
+
+# Cards are encoded as small integers 0-51: card = rank_index * 4 + suit_index,
+# with ranks ordered A..K and suits ordered like Game.suit_to_home_idx (c, d, h, s).
+SUITS = "cdhs"
+RANKS = "A23456789TJQK"
+
+CARD_NAMES = tuple(RANKS[c // 4] + SUITS[c % 4] for c in range(52))
+CARD_IDS = {name: c for c, name in enumerate(CARD_NAMES)}
+
+# Precomputed lookup tables so rule checks never touch strings
+RANK = tuple(c // 4 + 1 for c in range(52))  # 1 (Ace) .. 13 (King)
+SUIT = tuple(c % 4 for c in range(52))
+RED = tuple(SUITS[c % 4] in "dh" for c in range(52))
+CARD_BYTES = tuple(bytes((c,)) for c in range(52))
+
+# Rank and color by card name for the string-based Game, "0x" home placeholders included
+NAME_RANK = dict({name: RANK[c] for c, name in enumerate(CARD_NAMES)}, **{"0" + suit: 0 for suit in SUITS})
+NAME_RED = dict({name: RED[c] for c, name in enumerate(CARD_NAMES)}, **{"0" + suit: suit in "dh" for suit in SUITS})
+
+# CAN_STACK[card * 52 + top] is 1 when card may be placed on top in a column
+CAN_STACK = bytes(
+    1 if RED[card] != RED[top] and RANK[card] + 1 == RANK[top] else 0
+    for card in range(52) for top in range(52)
+)
+
+WON_HOME = (13, 13, 13, 13)
+
+# Positions Board.is_dead_end() explores before giving up without a verdict
+DEAD_END_LIMIT = 2000
+
+# Zobrist keys. A position is the set of (card, what it rests on) pairs of the cards not
+# yet home: the card below it, COLUMN_BASE at the bottom of a column, or FREE_CELL.
+# Column order and free cell order leave that set unchanged, and a move changes the pair
+# of exactly one card (the bottom card of a moved sequence), so keys update in O(1).
+COLUMN_BASE = 52
+FREE_CELL = 53
+_zobrist_rng = random.Random(0x5eed)  # Fixed seed, so keys are the same in every process
+ZOBRIST = tuple(_zobrist_rng.getrandbits(64) for _ in range(52 * 54))
+
+
+def zobrist(card, below):
+    return ZOBRIST[card * 54 + below]
+
+
+def zobrist_key(columns, free):
+    # Full key of a position, for building Boards; moves update it incrementally
+    key = 0
+    for column in columns:
+        below = COLUMN_BASE
+        for card in column:
+            key ^= ZOBRIST[card * 54 + below]
+            below = card
+    for card in free:
+        key ^= ZOBRIST[card * 54 + FREE_CELL]
+    return key
+
+
+class Board(namedtuple("Board", "columns free home key")):
+    """
+    Compact, immutable and hashable FreeCell position.
+
+    columns: tuple of 8 bytes objects, bottom card first (same order as Game.table).
+    free: sorted tuple of card ids in the free cells.
+    home: tuple of 4 foundation heights indexed by suit (0 = empty, 13 = complete).
+    key: Zobrist key, equal for positions that differ only in column or free cell order.
+
+    Moves use the same tuples as Game.get_possible_moves(), including
+    ('sequence_to_column', src, dst, count); free cell indices refer to positions
+    in the sorted free tuple.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def build(cls, columns, free, home):
+        # free must already be sorted
+        return cls(columns, free, home, zobrist_key(columns, free))
+
+    @classmethod
+    def from_lists(cls, table, free, home):
+        columns = tuple(bytes(CARD_IDS[card] for card in column) for column in table)
+        free_ids = tuple(sorted(CARD_IDS[card] for card in free))
+        # Home piles start with a "0x" placeholder card
+        heights = tuple(len(pile) - 1 for pile in home)
+        return cls.build(columns, free_ids, heights)
+
+    def to_lists(self):
+        table = [[CARD_NAMES[card] for card in column] for column in self.columns]
+        free = [CARD_NAMES[card] for card in self.free]
+        home = [["0" + suit] + [RANKS[r] + suit for r in range(height)]
+                for suit, height in zip(SUITS, self.home)]
+        return table, free, home
+
+    def is_won(self):
+        return self.home == WON_HOME
+
+    def cards_home(self):
+        return sum(self.home)
+
+    def canonical(self):
+        # Column order and free cell order do not change the position.
+        # Exact, but O(board); self.key identifies the same positions in O(1).
+        return tuple(sorted(self.columns)), self.free, self.home
+
+    def is_safe_home(self, card):
+        # Aces and twos, or cards whose opposite-colored next-lower ranks are already home,
+        # can never be needed in a column again
+        rank = RANK[card]
+        if self.home[SUIT[card]] + 1 != rank:
+            return False
+        if rank <= 2:
+            return True
+        home = self.home
+        if RED[card]:
+            return home[0] >= rank - 1 and home[3] >= rank - 1
+        return home[1] >= rank - 1 and home[2] >= rank - 1
+
+    def has_free_space(self):
+        return len(self.free) < 4 or not all(self.columns)
+
+    def has_home_move(self):
+        home = self.home
+        for column in self.columns:
+            if column and home[SUIT[column[-1]]] + 1 == RANK[column[-1]]:
+                return True
+        return any(home[SUIT[card]] + 1 == RANK[card] for card in self.free)
+
+    def is_dead_end(self, max_positions=DEAD_END_LIMIT):
+        """
+        True when the position provably cannot be won: every free cell and column is
+        occupied, and no sequence of the remaining column-to-column moves ever frees one
+        or sends a card home. This covers cards buried beneath lower cards of their suit
+        and cycles of blocked dependencies between columns.
+        Returns False when in doubt, including after max_positions positions.
+        """
+        if self.has_free_space() or self.has_home_move() or self.is_won():
+            return False
+        # Without free space the only moves shuffle single cards between columns;
+        # any move that frees a cell or a column, or exposes a home card, ends the search
+        seen = {self.key}
+        stack = [self]
+        while stack:
+            board = stack.pop()
+            if board.has_free_space() or board.has_home_move():
+                return False
+            for move in board.legal_moves():
+                child = board.play(move)
+                if child.key not in seen:
+                    if len(seen) >= max_positions:
+                        return False
+                    seen.add(child.key)
+                    stack.append(child)
+        return True
+
+    def autoplay(self):
+        """
+        Repeatedly sends every provably safe card home.
+        Returns the resulting Board and the list of moves played.
+        """
+        board = self
+        moves = []
+        move = board.safe_home_move()
+        while move is not None:
+            board = board.play(move)
+            moves.append(move)
+            move = board.safe_home_move()
+        return board, moves
+
+    def safe_home_move(self):
+        for src, column in enumerate(self.columns):
+            if column and self.is_safe_home(column[-1]):
+                return ('column_to_home', src)
+        for src_idx, card in enumerate(self.free):
+            if self.is_safe_home(card):
+                return ('free_to_home', src_idx)
+        return None
+
+    def play_closed(self, move):
+        # A move followed by its safe-to-home closure, as the search sees it
+        board, auto_moves = self.play(move).autoplay()
+        return board, [move] + auto_moves
+
+    def legal_moves(self):
+        columns, free, home, _ = self
+        moves = []
+        # 1. Column to Column
+        for src in range(8):
+            column = columns[src]
+            if column:
+                base = column[-1] * 52
+                for dst in range(8):
+                    if src != dst:
+                        target = columns[dst]
+                        if not target or CAN_STACK[base + target[-1]]:
+                            moves.append(('column_to_column', src, dst))
+
+        # 2. Column to FreeCell
+        if len(free) < 4:
+            for src in range(8):
+                if columns[src]:
+                    moves.append(('column_to_free', src))
+
+        # 3. FreeCell to Column
+        for src_idx, card in enumerate(free):
+            base = card * 52
+            for dst in range(8):
+                target = columns[dst]
+                if not target or CAN_STACK[base + target[-1]]:
+                    moves.append(('free_to_column', src_idx, dst))
+
+        # 4. Column to HomeCell
+        for src in range(8):
+            column = columns[src]
+            if column:
+                card = column[-1]
+                if home[SUIT[card]] + 1 == RANK[card]:
+                    moves.append(('column_to_home', src))
+
+        # 5. FreeCell to HomeCell
+        for src_idx, card in enumerate(free):
+            if home[SUIT[card]] + 1 == RANK[card]:
+                moves.append(('free_to_home', src_idx))
+
+        # 6. Sequence to Column (supermoves of 2+ cards)
+        empty_columns = sum(1 for column in columns if not column)
+        free_cells = 4 - len(free)
+        for src in range(8):
+            column = columns[src]
+            run = run_length(column)
+            if run < 2:
+                continue
+            for dst in range(8):
+                if src == dst:
+                    continue
+                target = columns[dst]
+                if target:
+                    # Only one card of the run can sit on the destination's top card
+                    count = RANK[target[-1]] - RANK[column[-1]]
+                    if (2 <= count <= run and count <= max_sequence(free_cells, empty_columns)
+                            and CAN_STACK[column[-count] * 52 + target[-1]]):
+                        moves.append(('sequence_to_column', src, dst, count))
+                else:
+                    # Into an empty column only the longest movable run is worth trying
+                    count = min(run, max_sequence(free_cells, empty_columns - 1))
+                    if count >= 2 and count < len(column):
+                        moves.append(('sequence_to_column', src, dst, count))
+        return moves
+
+    def play(self, move):
+        """Returns the Board reached by a legal move; the move is not re-validated."""
+        columns, free, home, key = self
+        move_type = move[0]
+        if move_type == 'column_to_column':
+            src, dst = move[1], move[2]
+            cols = list(columns)
+            column, target = cols[src], cols[dst]
+            card = column[-1]
+            key ^= (zobrist(card, column[-2] if len(column) > 1 else COLUMN_BASE)
+                    ^ zobrist(card, target[-1] if target else COLUMN_BASE))
+            cols[src] = column[:-1]
+            cols[dst] = target + CARD_BYTES[card]
+            return Board(tuple(cols), free, home, key)
+        if move_type == 'column_to_free':
+            src = move[1]
+            cols = list(columns)
+            column = cols[src]
+            card = column[-1]
+            key ^= zobrist(card, column[-2] if len(column) > 1 else COLUMN_BASE) ^ zobrist(card, FREE_CELL)
+            cols[src] = column[:-1]
+            return Board(tuple(cols), tuple(sorted(free + (card,))), home, key)
+        if move_type == 'free_to_column':
+            src_idx, dst = move[1], move[2]
+            card = free[src_idx]
+            cols = list(columns)
+            target = cols[dst]
+            key ^= zobrist(card, FREE_CELL) ^ zobrist(card, target[-1] if target else COLUMN_BASE)
+            cols[dst] = target + CARD_BYTES[card]
+            return Board(tuple(cols), free[:src_idx] + free[src_idx + 1:], home, key)
+        if move_type == 'column_to_home':
+            src = move[1]
+            cols = list(columns)
+            column = cols[src]
+            card = column[-1]
+            key ^= zobrist(card, column[-2] if len(column) > 1 else COLUMN_BASE)
+            cols[src] = column[:-1]
+            return Board(tuple(cols), free, _raise_home(home, SUIT[card]), key)
+        if move_type == 'free_to_home':
+            src_idx = move[1]
+            card = free[src_idx]
+            key ^= zobrist(card, FREE_CELL)
+            return Board(columns, free[:src_idx] + free[src_idx + 1:], _raise_home(home, SUIT[card]), key)
+        if move_type == 'sequence_to_column':
+            src, dst, count = move[1], move[2], move[3]
+            cols = list(columns)
+            column, target = cols[src], cols[dst]
+            # Only the bottom card of the sequence rests on something new
+            card = column[-count]
+            key ^= (zobrist(card, column[-count - 1] if len(column) > count else COLUMN_BASE)
+                    ^ zobrist(card, target[-1] if target else COLUMN_BASE))
+            cols[dst] = target + column[-count:]
+            cols[src] = column[:-count]
+            return Board(tuple(cols), free, home, key)
+        raise ValueError(f"Unknown move type: {move_type}")
+
+
+def ms_deal(number):
+    """
+    Card order of Microsoft FreeCell deal `number`, dealt row by row into the 8 columns.
+    Uses the original Microsoft C runtime LCG, so deal numbers match the classic game.
+    """
+    state = number
+    cards = list(range(51, -1, -1))
+    for i in range(52):
+        state = (state * 214013 + 2531011) & 0x7fffffff
+        j = 51 - (state >> 16) % (52 - i)
+        cards[i], cards[j] = cards[j], cards[i]
+    return cards
+
+
+def run_length(column):
+    # Number of cards at the top of a column forming an alternating-color descending run
+    length = min(len(column), 1)
+    i = len(column) - 1
+    while i > 0 and CAN_STACK[column[i] * 52 + column[i - 1]]:
+        length += 1
+        i -= 1
+    return length
+
+
+def max_sequence(free_cells, empty_columns):
+    # Standard supermove limit: (free cells + 1) * 2 ^ (empty columns not used as the target)
+    return (free_cells + 1) * 2 ** max(empty_columns, 0)
+
+
+def _raise_home(home, suit):
+    return home[:suit] + (home[suit] + 1,) + home[suit + 1:]
@@ -0,0 +1,124 @@
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+
+# Move tuple fields that hold column indices, which depend on column order
+_COLUMN_FIELDS = {
+    'column_to_column': (1, 2),
+    'column_to_free': (1,),
+    'free_to_column': (2,),
+    'column_to_home': (1,),
+    'free_to_home': (),
+    'sequence_to_column': (1, 2),
+}
+
+
+def position_key(board):
+    # Canonical bytes for a position: sorted columns, sorted free cells and foundation heights,
+    # so positions that differ only in column or free cell order share a key
+    return bytes(board.home) + bytes(board.free) + b"\xff" + b"\xff".join(sorted(board.columns))
+
+
+def canonical_order(board):
+    # order[k] is the actual index of the k-th column in canonical (sorted) order
+    return sorted(range(len(board.columns)), key=lambda i: board.columns[i])
+
+
+def _remap(moves, mapping):
+    remapped = []
+    for move in moves:
+        move = list(move)
+        for field in _COLUMN_FIELDS[move[0]]:
+            move[field] = mapping[move[field]]
+        remapped.append(tuple(move))
+    return remapped
+
+
+class SolutionCache:
+    """
+    Bounded LRU cache of solver results keyed by canonical position.
+    Each entry is (solved, moves): solved is True for a full solution line, False for a
+    position proven unsolvable (no moves) and None for a position the solver gave up on
+    within its budget (no moves), which saves retrying it at that budget.
+    Moves are stored in canonical column order and mapped back to the caller's board,
+    and free cell indices follow Board's sorted free cells.
+    With path set, entries are also persisted to a local SQLite database.
+    """
+
+    def __init__(self, max_entries=100000, path=None):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()  # Hints run in executor threads
+        self.db = None
+        if path:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute("CREATE TABLE IF NOT EXISTS solutions (key BLOB PRIMARY KEY, solved INTEGER, moves TEXT)")
+            self.db.commit()
+
+    def lookup(self, board):
+        """Returns (solved, moves) with moves in board's own column order, or None on a miss."""
+        key = position_key(board)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            elif self.db is not None:
+                row = self.db.execute("SELECT solved, moves FROM solutions WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    solved = None if row[0] is None else bool(row[0])
+                    entry = (solved, [tuple(move) for move in json.loads(row[1])])
+                    self._remember(key, entry)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        solved, moves = entry
+        return solved, _remap(moves, canonical_order(board))
+
+    def store(self, board, solved, moves=()):
+        with self.lock:
+            self._put(board, solved, moves)
+            if self.db is not None:
+                self.db.commit()
+
+    def store_line(self, board, moves):
+        # Every position along a solution line is solved by the rest of the line
+        moves = list(moves)
+        with self.lock:
+            for i, move in enumerate(moves):
+                self._put(board, True, moves[i:])
+                board = board.play(move)
+            if self.db is not None:
+                self.db.commit()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "persistent": self.db is not None,
+            }
+
+    def _put(self, board, solved, moves):
+        order = canonical_order(board)
+        inverse = {actual: k for k, actual in enumerate(order)}
+        key = position_key(board)
+        entry = (solved, _remap(moves, inverse))
+        self._remember(key, entry)
+        if self.db is not None:
+            self.db.execute("INSERT OR REPLACE INTO solutions VALUES (?, ?, ?)",
+                            (key, None if solved is None else int(solved), json.dumps(entry[1])))
+
+    def _remember(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
@@ -0,0 +1,235 @@
+"""
+Deal index: solver results for a range of numbered deals in one compact file, read through
+mmap so a lookup touches only the bytes it needs.
+
+    python -m batch --deals 1-32000 --workers 16 --solutions --out results.jsonl
+    python -m deals results.jsonl --out deals.idx
+
+Each deal records whether it was solved, proven unsolvable or given up on, the length of
+the solution found, the solver's node count and the solution itself. Solved deals are split
+into easy, medium and hard thirds by node count, so a deal of a given difficulty is picked
+in O(1).
+"""
+import json
+import mmap
+import struct
+import sys
+from collections import namedtuple
+
+from board import CARD_IDS
+from engine import deal_game
+
+MAGIC = b"FCDX"
+# Magic, format version, first deal, deal count, node limits of easy and medium deals,
+# deals per difficulty and solution moves stored
+HEADER = struct.Struct("<4sHIIII3II")
+# Per deal: status, solution length in moves, solver nodes, offset of the solution in moves
+RECORD = struct.Struct("<BHII")
+DEAL = struct.Struct("<I")
+# A Board move as (move type, first, second, count) bytes
+MOVE = struct.Struct("<4B")
+
+MISSING, SOLVED, UNSOLVABLE, GAVE_UP = range(4)
+STATUS_NAMES = ("missing", "solved", "unsolvable", "gave_up")
+DIFFICULTIES = ("easy", "medium", "hard")
+MOVE_TYPES = ('column_to_column', 'column_to_free', 'free_to_column', 'column_to_home', 'free_to_home',
+              'sequence_to_column')
+_MOVE_CODES = {name: code for code, name in enumerate(MOVE_TYPES)}
+
+# difficulty is None unless the deal was solved
+DealInfo = namedtuple("DealInfo", "number status difficulty solution_length nodes")
+
+
+class DealIndex:
+    """
+    Read-only view of an index file. The file is mapped, not read, so opening it is cheap
+    and pages are loaded on first use.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.first_deal, self.deal_count, self.easy_nodes, self.medium_nodes,
+         *self.bucket_sizes, solution_moves) = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != 1:
+            raise ValueError(f"{path} is not a deal index")
+        # Sections follow the header: records, deal numbers by difficulty, solution moves
+        self.records_at = HEADER.size
+        self.buckets_at = []
+        offset = self.records_at + self.deal_count * RECORD.size
+        for size in self.bucket_sizes:
+            self.buckets_at.append(offset)
+            offset += size * DEAL.size
+        self.moves_at = offset
+
+    def __len__(self):
+        return self.deal_count
+
+    def lookup(self, number):
+        # DealInfo for a deal, or None if it is outside the index or was never solved for it
+        i = number - self.first_deal
+        if not 0 <= i < self.deal_count:
+            return None
+        status, length, nodes, _ = RECORD.unpack_from(self.data, self.records_at + i * RECORD.size)
+        if status == MISSING:
+            return None
+        return DealInfo(number, STATUS_NAMES[status], self.difficulty(nodes) if status == SOLVED else None,
+                        length, nodes)
+
+    def difficulty(self, nodes):
+        if nodes <= self.easy_nodes:
+            return "easy"
+        return "medium" if nodes <= self.medium_nodes else "hard"
+
+    def solution(self, number):
+        # Board moves solving the deal from its start, or None if none is stored
+        i = number - self.first_deal
+        if not 0 <= i < self.deal_count:
+            return None
+        status, length, _, offset = RECORD.unpack_from(self.data, self.records_at + i * RECORD.size)
+        if status != SOLVED or offset == 0xffffffff:
+            return None
+        start = self.moves_at + offset * MOVE.size
+        return [_decode_move(MOVE.unpack_from(self.data, start + k * MOVE.size)) for k in range(length)]
+
+    def random_deal(self, difficulty, rng):
+        # A deal number of the given difficulty, or None if the index has none
+        bucket = DIFFICULTIES.index(difficulty)
+        size = self.bucket_sizes[bucket]
+        if not size:
+            return None
+        return DEAL.unpack_from(self.data, self.buckets_at[bucket] + rng.randrange(size) * DEAL.size)[0]
+
+    def stats(self):
+        return {
+            "deals": self.deal_count,
+            "first_deal": self.first_deal,
+            **dict(zip(DIFFICULTIES, self.bucket_sizes)),
+        }
+
+
+def open_index(path):
+    # The app's index, or None when none is configured or the file does not exist yet
+    if not path:
+        return None
+    try:
+        return DealIndex(path)
+    except FileNotFoundError:
+        return None
+
+
+def board_moves(number, game_moves):
+    """
+    Converts a batch solution (Game moves, free cells in the game's own order) to Board
+    moves (free cells in sorted order) by replaying it on the deal.
+    Raises ValueError if the moves do not replay.
+    """
+    game = deal_game(number)
+    board = game.to_board()
+    moves = []
+    for move in game_moves:
+        move = tuple(move)
+        board_move = move
+        if move[0] in ('free_to_column', 'free_to_home'):
+            board_move = (move[0], board.free.index(CARD_IDS[game.free[move[1]]])) + move[2:]
+        if game.apply_move(move) is None:
+            raise ValueError(f"Deal {number}: illegal move {move}")
+        moves.append(board_move)
+        board = board.play(board_move)
+    if not board.is_won():
+        raise ValueError(f"Deal {number}: solution does not win")
+    return moves
+
+
+def read_results(paths):
+    # Solver records from batch JSONL files by deal; a later record of a deal replaces an earlier one
+    results = {}
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # Truncated last line of an interrupted run
+                if record.get("mode") in ("solve", "beam"):
+                    results[record["deal"]] = record
+    return results
+
+
+def build_index(results, path):
+    """
+    Writes the index for batch solver records keyed by deal number.
+    Returns the number of deals per difficulty.
+    """
+    first = min(results, default=1)
+    count = max(results, default=0) - first + 1
+    solved = sorted(record["nodes"] for record in results.values() if record["solved"])
+    easy_nodes = solved[len(solved) // 3] if solved else 0
+    medium_nodes = solved[2 * len(solved) // 3] if solved else 0
+
+    records = []
+    buckets = ([], [], [])
+    moves = []
+    for number in range(first, first + count):
+        record = results.get(number)
+        if record is None:
+            records.append(RECORD.pack(MISSING, 0, 0, 0))
+            continue
+        nodes = min(record["nodes"], 0xffffffff)
+        if not record["solved"]:
+            status = UNSOLVABLE if record["exhausted"] else GAVE_UP
+            records.append(RECORD.pack(status, 0, nodes, 0))
+            continue
+        offset = 0xffffffff  # Solved without --solutions: no line to serve
+        if "solution" in record:
+            offset = len(moves)
+            moves.extend(board_moves(number, record["solution"]))
+        records.append(RECORD.pack(SOLVED, min(record["moves"], 0xffff), nodes, offset))
+        if nodes <= easy_nodes:
+            buckets[0].append(number)
+        elif nodes <= medium_nodes:
+            buckets[1].append(number)
+        else:
+            buckets[2].append(number)
+
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, 1, first, count, easy_nodes, medium_nodes,
+                            *(len(bucket) for bucket in buckets), len(moves)))
+        f.write(b"".join(records))
+        for bucket in buckets:
+            f.write(b"".join(DEAL.pack(number) for number in bucket))
+        f.write(b"".join(_encode_move(move) for move in moves))
+    return dict(zip(DIFFICULTIES, (len(bucket) for bucket in buckets)))
+
+
+def _encode_move(move):
+    fields = move[1:] + (0,) * (4 - len(move))
+    return MOVE.pack(_MOVE_CODES[move[0]], *fields)
+
+
+def _decode_move(packed):
+    code, a, b, count = packed
+    name = MOVE_TYPES[code]
+    if name in ('column_to_free', 'column_to_home', 'free_to_home'):
+        return (name, a)
+    if name == 'sequence_to_column':
+        return (name, a, b, count)
+    return (name, a, b)
+
+
+def main(argv=None):
+    import argparse  # Only the CLI needs it; the server imports this module too
+
+    parser = argparse.ArgumentParser(description="Build the deal index from batch solver results.")
+    parser.add_argument("results", nargs="+", help="JSONL files written by python -m batch --mode solve or beam")
+    parser.add_argument("--out", default="deals.idx", help="Index file to write (default deals.idx)")
+    args = parser.parse_args(argv)
+
+    results = read_results(args.results)
+    counts = build_index(results, args.out)
+    print(f"Indexed {len(results)} deals: {counts['easy']} easy, {counts['medium']} medium, "
+          f"{counts['hard']} hard.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
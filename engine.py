@@ -0,0 +1,982 @@
+"""
+Game rules, MCTS and the solver entry points: everything the server, batch runs and
+benchmarks need, without the interactive CLI (main.py) or any web dependency.
+"""
+import os
+import random
+import time
+from collections import namedtuple
+
+from board import (Board, CARD_IDS, CARD_NAMES, COLUMN_BASE, FREE_CELL, NAME_RANK, NAME_RED, ms_deal, run_length,
+                   zobrist)
+import solver
+
+# MCTS settings: rollout policy (a ROLLOUT_POLICIES key), rollout depth in moves, UCB
+# exploration constant, random move rate of epsilon_greedy, whether rollouts that do not
+# win still earn a reward for the cards they sent home (plain win/loss rewards leave almost
+# every rollout at 0 on real deals), and rollouts per leaf. With rollout_batch > 1 the
+# rollouts of a leaf run together in the NumPy engine (vector.py) with the random policy.
+SearchConfig = namedtuple("SearchConfig", "policy rollout_depth c_param epsilon shaped rollout_batch",
+                          defaults=("random", 40, 1.4, 0.1, True, 1))
+
+# Weights of score_board: cards home, free cells free, empty columns, cards in ordered runs
+SCORE_WEIGHTS = (1.0, 0.5, 1.0, 0.25)
+
+# Highest reward a shaped rollout can earn without winning
+SHAPED_REWARD_CAP = 0.5
+
+
+class Game:
+    deck = ["2c", "2d", "2h", "2s", "3c", "3d", "3h", "3s", "4c", "4d", "4h", "4s", "5c", "5d", "5h", "5s",
+            "6c", "6d", "6h", "6s", "7c", "7d", "7h", "7s", "8c", "8d", "8h", "8s", "9c", "9d", "9h", "9s",
+            "Tc", "Td", "Th", "Ts", "Jc", "Jd", "Jh", "Js", "Qc", "Qd", "Qh", "Qs", "Kc", "Kd", "Kh", "Ks",
+            "Ac", "Ad", "Ah", "As"]
+
+    def __init__(self, record_history=True, seed=None):
+        # Per-instance RNG for shuffling and MCTS rollouts; never the shared global one
+        self.rng = random.Random(seed)
+        self.deal_number = None
+        self.table = []
+        self.free = []
+        self.home = []
+        # Log of (move, card) pairs; undo reverses the last one. A list of pairs is one step
+        # made of several moves (a computer move and the safe-to-home closure played with it).
+        # Solver-internal games can turn it off entirely.
+        self.history = []
+        self.record_history = record_history
+        # Bumped on every change to the board, so clients can tell whether their copy is current
+        self.version = 0
+        # Zobrist key of the position (Board.key), updated move by move
+        self.key = 0
+        # MCTS tree kept between computer_play calls, rooted at the current position
+        self.search_root = None
+        self.max_tree_nodes = 100000
+        # Mapping for suits to home cell indices
+        self.suit_to_home_idx = {'c': 0, 'd': 1, 'h': 2, 's': 3}
+
+    def __getstate__(self):
+        # The search tree is only a cache; it is rebuilt on demand instead of being pickled
+        state = self.__dict__.copy()
+        state['search_root'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # The key is derived from the board, so it is recomputed for pickles made without it
+        if 'key' not in state:
+            self.key = self.to_board().key
+
+    def start(self, seed=None, deal_number=None):
+        """
+        Deals a new game.
+        deal_number reproduces the classic Microsoft FreeCell deal with that number;
+        otherwise the deck is shuffled by this game's RNG, reseeded first if seed is given.
+        """
+        if deal_number is not None:
+            deck = [CARD_NAMES[card] for card in ms_deal(deal_number)]
+        else:
+            if seed is not None:
+                self.rng.seed(seed)
+            deck = list(Game.deck)
+            self.rng.shuffle(deck)
+        self.deal_number = deal_number
+        self.table = [[] for i in range(8)]
+        for i in range(6):
+            for j in range(8):
+                self.table[j].append(deck[8 * i + j])
+        for i in range(4):
+            self.table[i].append(deck[i + 48])
+        self.free = []
+        self.home = [[] for i in range(4)]
+        # Initialize home cells with a "0" card of each suit for easier value comparison
+        self.home[0].append("0c")  # Clubs
+        self.home[1].append("0d")  # Diamonds
+        self.home[2].append("0h")  # Hearts
+        self.home[3].append("0s")  # Spades
+        self.history = []
+        self.search_root = None
+        self.key = self.to_board().key
+        self.version += 1
+
+    def red(self, card):
+        return NAME_RED[card]
+
+    def value(self, card):
+        # 0 for the "0" cards in home cells
+        return NAME_RANK[card]
+
+    def stacks_on(self, card, top):
+        # Alternating colors and descending value
+        return self.red(card) != self.red(top) and self.value(card) + 1 == self.value(top)
+
+    def can_stack(self, card, column):
+        # Any card can go on an empty column
+        return not column or self.stacks_on(card, column[-1])
+
+    def run_length(self, src):
+        # Number of cards at the top of a column forming an alternating-color descending run
+        column = self.table[src]
+        length = min(len(column), 1)
+        i = len(column) - 1
+        while i > 0 and self.stacks_on(column[i], column[i - 1]):
+            length += 1
+            i -= 1
+        return length
+
+    def max_sequence(self, dst):
+        # Standard supermove limit: (free cells + 1) * 2 ^ (empty columns other than dst)
+        empty_columns = sum(1 for i, column in enumerate(self.table) if not column and i != dst)
+        return (4 - len(self.free) + 1) * 2 ** empty_columns
+
+    def can_go_home(self, card):
+        # Same suit and ascending value
+        home = self.home[self.suit_to_home_idx[card[1]]]
+        return self.value(card) == self.value(home[-1]) + 1
+
+    def is_legal(self, move):
+        move_type = move[0]
+        if move_type == 'column_to_column':
+            src, dst = move[1], move[2]
+            return bool(self.table[src]) and src != dst and self.can_stack(self.table[src][-1], self.table[dst])
+        if move_type == 'column_to_free':
+            return bool(self.table[move[1]]) and len(self.free) < 4
+        if move_type == 'free_to_column':
+            src, dst = move[1], move[2]
+            return src < len(self.free) and self.can_stack(self.free[src], self.table[dst])
+        if move_type == 'column_to_home':
+            return bool(self.table[move[1]]) and self.can_go_home(self.table[move[1]][-1])
+        if move_type == 'free_to_home':
+            return move[1] < len(self.free) and self.can_go_home(self.free[move[1]])
+        if move_type == 'sequence_to_column':
+            src, dst, count = move[1], move[2], move[3]
+            return (src != dst and 2 <= count <= self.run_length(src) and count <= self.max_sequence(dst)
+                    and self.can_stack(self.table[src][-count], self.table[dst]))
+        return False
+
+    def move_column(self, src, dst, count=1):
+        if count < 1:
+            return False  # Not a move, rather than a single card
+        if count > 1:
+            return self.apply_move(('sequence_to_column', src, dst, count)) is not None
+        return self.apply_move(('column_to_column', src, dst)) is not None
+
+    def move_to_free(self, src):
+        return self.apply_move(('column_to_free', src)) is not None
+
+    def move_from_free(self, src, dst):
+        return self.apply_move(('free_to_column', src, dst)) is not None
+
+    def column_to_home(self, src):  # Removed dst parameter
+        return self.apply_move(('column_to_home', src)) is not None
+
+    def free_to_home(self, src):  # Removed dst parameter
+        return self.apply_move(('free_to_home', src)) is not None
+
+    def apply_move(self, move):
+        """
+        Applies a move in place if it is legal.
+        Returns the moved card (needed by unapply_move), or None if the move is illegal.
+        """
+        if not self.is_legal(move):
+            return None
+        self.key ^= self._key_change(move)
+        card = self._perform(move)
+        self.expand_history(move, card)
+        self.version += 1
+        return card
+
+    def unapply_move(self, move, card):
+        """Reverts the last move made with apply_move, given the card it returned."""
+        self._revert(move, card)
+        self.key ^= self._key_change(move)
+        self.version += 1
+        if self.record_history:
+            self.history.pop()
+
+    def _key_change(self, move):
+        # XOR that takes self.key across move, from the position before it; the moved card
+        # (the bottom one of a sequence) leaves what it rested on for its new place
+        move_type = move[0]
+        if move_type in ('free_to_column', 'free_to_home'):
+            card = CARD_IDS[self.free[move[1]]]
+            change = zobrist(card, FREE_CELL)
+        else:
+            column = self.table[move[1]]
+            depth = move[3] if move_type == 'sequence_to_column' else 1
+            card = CARD_IDS[column[-depth]]
+            change = zobrist(card, CARD_IDS[column[-depth - 1]] if len(column) > depth else COLUMN_BASE)
+        if move_type == 'column_to_free':
+            change ^= zobrist(card, FREE_CELL)
+        elif move_type not in ('column_to_home', 'free_to_home'):
+            target = self.table[move[2]]
+            change ^= zobrist(card, CARD_IDS[target[-1]] if target else COLUMN_BASE)
+        return change
+
+    def _perform(self, move):
+        move_type = move[0]
+        if move_type == 'column_to_column':
+            card = self.table[move[1]].pop()
+            self.table[move[2]].append(card)
+        elif move_type == 'column_to_free':
+            card = self.table[move[1]].pop()
+            self.free.append(card)
+        elif move_type == 'free_to_column':
+            card = self.free.pop(move[1])
+            self.table[move[2]].append(card)
+        elif move_type == 'column_to_home':
+            card = self.table[move[1]].pop()
+            self.home[self.suit_to_home_idx[card[1]]].append(card)
+        elif move_type == 'free_to_home':
+            card = self.free.pop(move[1])
+            self.home[self.suit_to_home_idx[card[1]]].append(card)
+        else:  # sequence_to_column
+            column = self.table[move[1]]
+            cards = column[-move[3]:]
+            del column[-move[3]:]
+            self.table[move[2]].extend(cards)
+            card = cards[0]
+        return card
+
+    def _revert(self, move, card):
+        move_type = move[0]
+        if move_type == 'column_to_column':
+            self.table[move[1]].append(self.table[move[2]].pop())
+        elif move_type == 'column_to_free':
+            self.table[move[1]].append(self.free.pop())
+        elif move_type == 'free_to_column':
+            self.free.insert(move[1], self.table[move[2]].pop())
+        elif move_type == 'column_to_home':
+            self.table[move[1]].append(self.home[self.suit_to_home_idx[card[1]]].pop())
+        elif move_type == 'free_to_home':
+            self.free.insert(move[1], self.home[self.suit_to_home_idx[card[1]]].pop())
+        else:  # sequence_to_column
+            column = self.table[move[2]]
+            cards = column[-move[3]:]
+            del column[-move[3]:]
+            self.table[move[1]].extend(cards)
+
+    def expand_history(self, move, card):
+        # Only the move and the card it moved are kept; undo replays it backwards
+        if self.record_history:
+            self.history.append((move, card))
+
+    def group_history(self, count):
+        # Merges the last count history entries into a single undo step
+        if self.record_history and count > 1:
+            self.history[-count:] = [self.history[-count:]]
+
+    def last_step(self):
+        # Moves of the step undo would revert next, oldest first
+        if not self.history:
+            return []
+        entry = self.history[-1]
+        return [move for move, _ in entry] if isinstance(entry, list) else [entry[0]]
+
+    def history_moves(self):
+        # Every move in the history in the order played, grouped steps included
+        moves = []
+        for entry in self.history:
+            moves.extend(move for move, _ in (entry if isinstance(entry, list) else [entry]))
+        return moves
+
+    def undo(self):
+        if self.history:
+            entry = self.history.pop()
+            for move, card in reversed(entry) if isinstance(entry, list) else [entry]:
+                self._revert(move, card)
+                self.key ^= self._key_change(move)
+            self.version += 1
+            return True
+        return False
+
+    def is_game_won(self):
+        # Check if all home cells are full (King of each suit)
+        return all(self.value(home[-1]) == 13 for home in self.home)
+
+    def is_dead_end(self):
+        # Provably lost position (see Board.is_dead_end); False when in doubt
+        return self.to_board().is_dead_end()
+
+    def get_possible_moves(self):
+        # Legality is checked directly against the board, nothing is copied
+        moves = []
+        tops = [column[-1] if column else None for column in self.table]
+        # 1. Column to Column
+        for src in range(8):
+            if tops[src]:
+                for dst in range(8):
+                    if src != dst and self.can_stack(tops[src], self.table[dst]):
+                        moves.append(('column_to_column', src, dst))
+
+        # 2. Column to FreeCell
+        if len(self.free) < 4:
+            for src in range(8):
+                if tops[src]:
+                    moves.append(('column_to_free', src))
+
+        # 3. FreeCell to Column
+        for src_idx, card in enumerate(self.free):
+            for dst in range(8):
+                if self.can_stack(card, self.table[dst]):
+                    moves.append(('free_to_column', src_idx, dst))
+
+        # 4. Column to HomeCell
+        for src in range(8):
+            if tops[src] and self.can_go_home(tops[src]):
+                moves.append(('column_to_home', src))
+
+        # 5. FreeCell to HomeCell
+        for src_idx, card in enumerate(self.free):
+            if self.can_go_home(card):
+                moves.append(('free_to_home', src_idx))
+
+        # 6. Sequence to Column (supermoves of 2+ cards)
+        for src in range(8):
+            run = self.run_length(src)
+            if run < 2:
+                continue
+            for dst in range(8):
+                if src == dst:
+                    continue
+                if self.table[dst]:
+                    # Only one card of the run can sit on the destination's top card
+                    count = self.value(self.table[dst][-1]) - self.value(tops[src])
+                    if (2 <= count <= run and count <= self.max_sequence(dst)
+                            and self.stacks_on(self.table[src][-count], self.table[dst][-1])):
+                        moves.append(('sequence_to_column', src, dst, count))
+                else:
+                    # Into an empty column only the longest movable run is worth trying
+                    count = min(run, self.max_sequence(dst))
+                    if 2 <= count < len(self.table[src]):
+                        moves.append(('sequence_to_column', src, dst, count))
+        return moves
+
+    def display_game(self):
+        print("\n--- Current Game State ---")
+        print("Free Cells:")
+        if self.free:
+            print("  " + " | ".join(self.free))
+        else:
+            print("  Empty")
+
+        print("\nHome Cells:")
+        # Display only the top card of home cells, excluding the "0" initializer
+        home_display = []
+        for h_cell in self.home:
+            if len(h_cell) > 1:  # If there's a card on top of "0"
+                home_display.append(h_cell[-1])
+            else:
+                home_display.append("Empty")
+        print("  " + " | ".join(home_display))
+
+        print("\nTable Columns:")
+        # Determine the maximum height of any column for formatted printing
+        max_height = max(len(col) for col in self.table) if self.table else 0
+
+        # Print cards row by row
+        for i in range(max_height):
+            row_str = "  "
+            for j in range(8):
+                if i < len(self.table[j]):
+                    row_str += f"{self.table[j][i]:<5}"  # Left-align card string
+                else:
+                    row_str += "     "  # Empty space for shorter columns
+            print(row_str)
+        print("--------------------------\n")
+
+    def to_board(self):
+        # Compact form used by the search engine
+        return Board.from_lists(self.table, self.free, self.home)
+
+    def load_board(self, board):
+        self.table, self.free, self.home = board.to_lists()
+        self.key = board.key
+        self.history = []
+        self.search_root = None
+        self.version += 1
+
+    def from_board_move(self, board, move):
+        # Board moves index free cells in sorted order; map them back to this game's free list
+        if move[0] in ('free_to_column', 'free_to_home'):
+            src_idx = self.free.index(CARD_NAMES[board.free[move[1]]])
+            return (move[0], src_idx) + tuple(move[2:])
+        return move
+
+    def translate_moves(self, board, moves):
+        # Replays Board moves on a scratch copy so free cell indices follow this game's order
+        scratch = Game(record_history=False)
+        scratch.table = [list(column) for column in self.table]
+        scratch.free = list(self.free)
+        scratch.home = [list(pile) for pile in self.home]
+        scratch.key = self.key
+        game_moves = []
+        for move in moves:
+            game_move = scratch.from_board_move(board, move)
+            scratch.apply_move(game_move)
+            game_moves.append(game_move)
+            board = board.play(move)
+        return game_moves
+
+    def auto_play(self):
+        """
+        Sends every provably safe card to its HomeCell.
+        Returns the list of moves made.
+        """
+        board = self.to_board()
+        moves = self.translate_moves(board, board.autoplay()[1])
+        for move in moves:
+            self.apply_move(move)
+        return moves
+
+    def solve(self, max_nodes=200000, time_limit=None, cache=None, memory_mb=None):
+        """
+        Searches for a complete solution from the current position without changing it.
+        Returns the list of moves (replayable with apply_move), or None if none was found
+        within max_nodes expansions / time_limit seconds.
+        With a SolutionCache, proven results are looked up first and stored afterwards; a
+        search that gives up is recorded as such (solved None), so callers can skip retrying.
+        With memory_mb, the memory-bounded beam search (solver.beam_solve) runs instead of A*.
+        """
+        board = self.to_board()
+        if cache is not None:
+            cached = cache.lookup(board)
+            if cached is not None and cached[0] is not None:
+                return self.translate_moves(board, cached[1]) if cached[0] else None
+        if memory_mb is not None:
+            result = solver.beam_solve(board, memory_mb=memory_mb, max_nodes=max_nodes, time_limit=time_limit)
+        else:
+            result = solver.solve(board, max_nodes=max_nodes, time_limit=time_limit)
+        if cache is not None:
+            if result.solved:
+                cache.store_line(board, result.moves)
+            elif result.exhausted:
+                cache.store(board, False)  # Proven unsolvable
+            else:
+                cache.store(board, None)  # Gave up within this budget
+        if not result.solved:
+            return None
+        return self.translate_moves(board, result.moves)
+
+    @staticmethod
+    def get_user_input(prompt):
+        return input(prompt)
+
+    def computer_play(self, simulations=None, workers=1, seed=None, time_ms=None, should_stop=None, cache=None,
+                      config=None, stats=None, solve_nodes=0):
+        """
+        Picks a move with MCTS and applies it.
+        With workers > 1 the simulations are split over independent root-parallel trees in
+        the shared process pool (at most MAX_WORKERS run at once) and their root statistics
+        are merged. A seed makes the result deterministic for any number of workers.
+        time_ms bounds the search by wall-clock time (and simulations, if given, still caps it);
+        the best move found when it runs out is played. If should_stop() turns true the
+        search is cancelled and nothing is played.
+        With a SolutionCache, a position on a cached solution line is played along it without
+        searching. With solve_nodes as well, a position the cache knows nothing about first gets
+        a weighted A* attempt of that many nodes (see solve), whose solution is cached along
+        its whole line and played; MCTS runs only when the attempt gives up or was made before.
+        Moves found by MCTS are not cached: they prove nothing, and reusing one would ignore
+        the budget, settings and seed of later calls.
+        config is a SearchConfig (rollout policy, rollout depth, UCB constant, reward).
+        A SearchStats passed as stats is filled in by the serial search.
+        """
+        config = config or SearchConfig()
+        if simulations is None and time_ms is None:
+            simulations = 100
+        time_limit = time_ms / 1000 if time_ms is not None else None
+        board = self.to_board()
+        cached = cache.lookup(board) if cache is not None else None
+        if cached is None and cache is not None and solve_nodes:
+            self.solve(max_nodes=solve_nodes, cache=cache)
+            cached = cache.lookup(board)
+        if cached is not None and cached[0] is True:
+            return self.play_search_move(board, cached[1][0])
+
+        root = None
+        if workers > 1:
+            self.search_root = None
+            if seed is None:
+                seed = self.rng.randrange(2 ** 32)
+            root_stats = parallel_search(board, simulations, workers, seed, time_limit, config, should_stop)
+        else:
+            rng = random.Random(seed) if seed is not None else self.rng
+            root = self.reuse_search_root(board)
+            deadline = time.monotonic() + time_limit if time_limit is not None else None
+            search(root, simulations, rng, deadline, should_stop, config, stats)
+            self.cap_search_tree(root)
+            root_stats = root_statistics(root)
+
+        if should_stop is not None and should_stop():
+            return None  # Cancelled by the caller
+
+        # Choose the best move from the root's children
+        if not root_stats:
+            return None  # No possible moves from current state
+        best_move = best_root_move(root_stats)
+        return self.play_search_move(board, best_move, root)
+
+    def play_search_move(self, board, move, root=None):
+        # Plays a Board move chosen by search, keeping the graph below it (if any) for the next call
+        child = root.children.get(move) if root is not None else None
+        if child is not None:
+            prune_tree(child, self.max_tree_nodes)
+        self.search_root = child
+        game_move = self.from_board_move(board, move)
+        self.apply_move(game_move)
+        # Search nodes include the safe-to-home closure, so play it too to stay on the tree;
+        # the move and its closure are undone together
+        self.group_history(1 + len(self.auto_play()))
+        return game_move
+
+    def hint_stream(self, simulations=None, time_ms=None, report_every=50, seed=None, should_stop=None,
+                    config=None, stats=None):
+        """
+        Anytime hint: runs MCTS on the kept tree without playing a move and yields the current
+        best move every report_every simulations, as a dict with the move, its visits and wins,
+        and the simulations run so far. Stops after simulations / time_ms (100 simulations if
+        neither is given), or as soon as should_stop() returns true.
+        config and stats are as for computer_play.
+        """
+        config = config or SearchConfig()
+        if simulations is None and time_ms is None:
+            simulations = 100
+        deadline = time.monotonic() + time_ms / 1000 if time_ms is not None else None
+        rng = random.Random(seed) if seed is not None else self.rng
+        board = self.to_board()
+        root = self.reuse_search_root(board)
+        total = 0
+        while True:
+            chunk = report_every if simulations is None else min(report_every, simulations - total)
+            if chunk <= 0:
+                return
+            ran = search(root, chunk, rng, deadline, should_stop, config, stats)
+            self.cap_search_tree(root)
+            total += ran
+            root_stats = root_statistics(root)
+            if not root_stats:
+                return  # No possible moves from current state
+            move = best_root_move(root_stats)
+            visits, wins = root_stats[move]
+            yield {"move": self.from_board_move(board, move), "visits": visits, "wins": wins,
+                   "simulations": total}
+            if ran < chunk:
+                return  # Out of time or stopped
+
+    def cap_search_tree(self, root):
+        # Searching in place grows the kept graph without re-rooting it, so the node cap is
+        # enforced after every search too; the table holds every node of the graph
+        if len(root.table) > self.max_tree_nodes:
+            prune_tree(root, self.max_tree_nodes)
+
+    def reuse_search_root(self, board):
+        # The kept graph is reused from wherever it already holds this exact position,
+        # for instance after a human move that matches one of the root's children
+        root = self.search_root
+        if root is not None:
+            node = root.table.get(self.key)
+            if node is not None and node.game_state == board:
+                if node is not root:
+                    prune_tree(node, self.max_tree_nodes)
+                    self.search_root = node
+                return node
+        self.search_root = MCTSNode(board)
+        return self.search_root
+
+
+def deal_game(number):
+    # Microsoft-numbered deal, so results line up with the classic deal catalog
+    game = Game(record_history=False, seed=number)
+    game.start(deal_number=number)
+    return game
+
+
+class MCTSNode:
+    """
+    Node of the MCTS search graph. Positions that differ only in column or free cell order
+    share one node, found by Board.key in the table shared by every node of the graph, so
+    a node can be the child of several parents.
+    """
+
+    def __init__(self, game_state, table=None):
+        self.game_state = game_state  # Immutable Board, shared safely between nodes
+        self.table = table if table is not None else {}
+        self.table[game_state.key] = self
+        self.children = {}  # Move -> child node
+        self.wins = 0
+        self.visits = 0
+        # Provably lost positions are leaves: never expanded, every rollout a loss
+        self.dead_end = game_state.is_dead_end()
+        self.unexplored_moves = [] if self.dead_end else game_state.legal_moves()
+
+    def ucb1(self, parent_visits, c_param=1.4):
+        if self.visits == 0:
+            return float('inf')
+        return (self.wins / self.visits) + c_param * (parent_visits ** 0.5 / self.visits ** 0.5)
+
+    def select_child(self, c_param=1.4, path=()):
+        # Best child not already on the selection path; None when every child is on it
+        children = [child for child in self.children.values() if child not in path]
+        if not children:
+            return None
+        return max(children, key=lambda child: child.ucb1(self.visits, c_param))
+
+    def expand(self, stats=None, path=()):
+        """
+        Adds the child reached by the next unexplored move and returns it, reusing the node
+        of a transposition. Moves back to a position on the selection path, or to a child
+        this node already has, are dropped. Returns None when no move is left.
+        """
+        while self.unexplored_moves:
+            move = self.unexplored_moves.pop()
+            # Safe home moves are part of every move, so they never become separate nodes
+            start = time.perf_counter()
+            new_game_state, _ = self.game_state.play_closed(move)
+            created = time.perf_counter()
+            child_node = self.table.get(new_game_state.key)
+            if child_node is None:
+                child_node = MCTSNode(new_game_state, self.table)
+                if stats is not None:
+                    stats.nodes_created += 1
+            elif child_node in path or any(child is child_node for child in self.children.values()):
+                continue  # A cycle, or a second move to the same position
+            elif stats is not None:
+                stats.transpositions += 1
+            if stats is not None:
+                stats.copy_seconds += created - start
+                stats.movegen_seconds += time.perf_counter() - created
+            self.children[move] = child_node
+            return child_node
+        return None
+
+    def simulate(self, rng=random, config=SearchConfig()):
+        """Plays a rollout with the configured policy; returns its reward (1 for a win)."""
+        return self.rollout(rng, config)[0]
+
+    def rollout(self, rng=random, config=SearchConfig()):
+        """
+        Plays config.rollout_batch rollouts (usually one) with the configured policy;
+        returns (reward, moves played), both summed over the rollouts.
+        """
+        if self.dead_end:
+            return 0, 0
+        if config.rollout_batch > 1:
+            import vector  # NumPy is only needed for batched rollouts
+            return vector.rollouts(self.game_state, config.rollout_batch, rng.getrandbits(64), config)
+        choose = ROLLOUT_POLICIES[config.policy]
+        current_game = self.game_state
+        seen = {current_game.key}  # Positions already visited by this rollout
+        played = 0
+        while played < config.rollout_depth:
+            if current_game.is_won():
+                return 1, played
+            possible_moves = current_game.legal_moves()
+            if not possible_moves:
+                return 0, played
+
+            home_moves = [m for m in possible_moves if m[0] == 'column_to_home' or m[0] == 'free_to_home']
+            if home_moves:
+                # Home moves always make progress, so they can never repeat a position
+                current_game, _ = current_game.play_closed(rng.choice(home_moves))
+            else:
+                next_game = choose(current_game, possible_moves, seen, rng, config)
+                if next_game is None:
+                    break  # Every move repeats a position
+                seen.add(next_game.key)
+                current_game = next_game
+            played += 1
+            if current_game.is_dead_end():
+                return 0, played
+        return rollout_reward(current_game, config), played
+
+
+def search(root, simulations, rng=random, deadline=None, should_stop=None, config=SearchConfig(), stats=None):
+    """
+    Runs MCTS simulations on an existing tree until `simulations` have run (None for no
+    limit), time.monotonic() passes deadline, or should_stop() returns true.
+    config is a SearchConfig; a SearchStats passed as stats is filled in along the way.
+    Returns the number of simulations run.
+    """
+    done = 0
+    while simulations is None or done < simulations:
+        if done and ((deadline is not None and time.monotonic() >= deadline)
+                     or (should_stop is not None and should_stop())):
+            break
+        done += 1
+        start = time.perf_counter()
+        node = root
+        # Selection. Nodes have several parents, so results go back along the path taken;
+        # the path never visits a node twice
+        path = [root]
+        on_path = {root}
+        while node.children and not node.unexplored_moves:
+            child = node.select_child(config.c_param, on_path)
+            if child is None:
+                break  # Every child leads back onto the path; play out from here
+            node = child
+            path.append(node)
+            on_path.add(node)
+        if stats is not None:
+            stats.selection_seconds += time.perf_counter() - start
+
+        # Expansion
+        if node.unexplored_moves:
+            child = node.expand(stats, on_path)
+            if child is not None:
+                node = child
+                path.append(node)
+
+        # Simulation
+        start = time.perf_counter()
+        result, played = node.rollout(rng, config)
+        simulated = time.perf_counter()
+
+        # Backpropagation
+        for visited in path:
+            visited.visits += config.rollout_batch
+            visited.wins += result
+        if stats is not None:
+            stats.rollouts += config.rollout_batch
+            stats.rollout_moves += played
+            stats.rollout_seconds += simulated - start
+            stats.backprop_seconds += time.perf_counter() - simulated
+    if stats is not None:
+        stats.measure_tree(root)
+    return done
+
+
+class SearchStats:
+    """
+    Instrumentation filled in by search(stats=...): nodes created, expansions that reached an
+    existing node (transpositions), rollouts and their moves,
+    seconds spent selecting, generating moves for new nodes, copying positions, in rollouts
+    and backpropagating, and the depth and widest level of the tree.
+    """
+
+    def __init__(self):
+        self.nodes_created = 0
+        self.transpositions = 0
+        self.rollouts = 0
+        self.rollout_moves = 0
+        self.selection_seconds = 0.0
+        self.movegen_seconds = 0.0
+        self.copy_seconds = 0.0
+        self.rollout_seconds = 0.0
+        self.backprop_seconds = 0.0
+        self.tree_nodes = 0
+        self.tree_depth = 0
+        self.tree_width = 0
+
+    def measure_tree(self, root):
+        # Breadth first, so a node shared by several parents counts once, at its shallowest depth
+        levels = []
+        level = [root]
+        seen = {root}
+        while level:
+            levels.append(len(level))
+            level = [child for node in level for child in node.children.values()
+                     if child not in seen and not seen.add(child)]
+        self.tree_nodes = sum(levels)
+        self.tree_depth = len(levels) - 1
+        self.tree_width = max(levels)
+
+    def as_dict(self):
+        data = dict(self.__dict__)
+        data["avg_rollout_length"] = self.rollout_moves / self.rollouts if self.rollouts else 0.0
+        return data
+
+
+def score_board(board):
+    # Rollout score: cards home, free cells free, empty columns and cards already sitting
+    # in order on the card below, weighted by SCORE_WEIGHTS
+    home_weight, free_weight, empty_weight, run_weight = SCORE_WEIGHTS
+    empty_columns = 0
+    ordered = 0
+    for column in board.columns:
+        if column:
+            ordered += run_length(column) - 1
+        else:
+            empty_columns += 1
+    return (home_weight * sum(board.home) + free_weight * (4 - len(board.free))
+            + empty_weight * empty_columns + run_weight * ordered)
+
+
+def rollout_reward(board, config):
+    # 1 for a win; shaped rollouts also earn up to SHAPED_REWARD_CAP for cards sent home
+    if board.is_won():
+        return 1
+    if not config.shaped:
+        return 0
+    return SHAPED_REWARD_CAP * sum(board.home) / 52
+
+
+def random_rollout(board, moves, seen, rng, config):
+    # Uniformly random move, skipping moves back to a position this rollout has seen
+    moves = list(moves)
+    while moves:
+        next_board, _ = board.play_closed(moves.pop(rng.randrange(len(moves))))
+        if next_board.key not in seen:
+            return next_board
+    return None
+
+
+def greedy_rollout(board, moves, seen, rng, config):
+    # Highest score_board successor not yet seen by this rollout; ties are broken at random
+    scored = []
+    for move in moves:
+        next_board, _ = board.play_closed(move)
+        scored.append((score_board(next_board), rng.random(), next_board))
+    scored.sort(reverse=True)
+    for _, _, next_board in scored:
+        if next_board.key not in seen:
+            return next_board
+    return None
+
+
+def epsilon_greedy_rollout(board, moves, seen, rng, config):
+    # Greedy, except for a random move with probability config.epsilon
+    if rng.random() < config.epsilon:
+        return random_rollout(board, moves, seen, rng, config)
+    return greedy_rollout(board, moves, seen, rng, config)
+
+
+# Rollout policies by name: each picks the next rollout position (None when every
+# move repeats one) from the board, its legal moves and the positions already seen
+ROLLOUT_POLICIES = {
+    "random": random_rollout,
+    "greedy": greedy_rollout,
+    "epsilon_greedy": epsilon_greedy_rollout,
+}
+
+
+def root_statistics(root):
+    return {move: (child.visits, child.wins) for move, child in root.children.items()}
+
+
+def best_root_move(stats):
+    # Highest win rate among visited root moves; the first one wins ties
+    best_move = None
+    best_win_rate = -1
+    for move, (visits, wins) in stats.items():
+        if visits > 0:
+            win_rate = wins / visits
+            if win_rate > best_win_rate:
+                best_win_rate = win_rate
+                best_move = move
+    return best_move
+
+
+def run_search(board, simulations, rng=random, time_limit=None, config=SearchConfig()):
+    """
+    Runs MCTS from a Board and returns {move: (visits, wins)} for the root's children.
+    Module-level so it can run in worker processes.
+    """
+    if isinstance(rng, int):
+        rng = random.Random(rng)
+    deadline = time.monotonic() + time_limit if time_limit is not None else None
+    root = MCTSNode(board)
+    search(root, simulations, rng, deadline, config=config)
+    return root_statistics(root)
+
+
+def reachable_nodes(root):
+    # Every node of the search graph reachable from root, each once, root first
+    nodes = [root]
+    seen = {root}
+    for node in nodes:
+        for child in node.children.values():
+            if child not in seen:
+                seen.add(child)
+                nodes.append(child)
+    return nodes
+
+
+def prune_tree(root, max_nodes):
+    """
+    Keeps root and the most-visited nodes below it, at most max_nodes in all, and drops the
+    rest. Moves to dropped nodes go back to their parent's unexplored moves; the parent keeps
+    its statistics. The shared table is rebuilt from what is still reachable from root.
+    Returns the resulting node count.
+    """
+    nodes = reachable_nodes(root)
+    if len(nodes) > max_nodes:
+        keep = set(sorted(nodes[1:], key=lambda n: n.visits, reverse=True)[:max_nodes - 1])
+        keep.add(root)
+        for node in nodes:
+            if node in keep:
+                for move, child in list(node.children.items()):
+                    if child not in keep:
+                        del node.children[move]
+                        node.unexplored_moves.append(move)
+        nodes = reachable_nodes(root)
+    root.table.clear()
+    root.table.update((node.game_state.key, node) for node in nodes)
+    return len(nodes)
+
+
+# Most worker processes a parallel search runs at once
+MAX_WORKERS = os.cpu_count() or 1
+
+# Long-lived process pool of MAX_WORKERS processes, shared by every game in the process
+_worker_pool = None
+
+
+def get_worker_pool():
+    global _worker_pool
+    if _worker_pool is None:
+        # multiprocessing is slow to import and most processes never search in parallel
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        # Spawned, not forked: the pool is created from a thread of a multi-threaded server,
+        # and a forked child could inherit a lock some other thread was holding
+        _worker_pool = ProcessPoolExecutor(max_workers=MAX_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _worker_pool
+
+
+def warm_worker_pool(workers):
+    # Runs a trivial job per worker in the shared pool, so the first parallel search does not
+    # wait for up to that many processes to spawn and import the engine
+    pool = get_worker_pool()
+    list(pool.map(abs, range(min(workers, MAX_WORKERS))))
+    return pool
+
+
+def shutdown_worker_pools():
+    global _worker_pool
+    if _worker_pool is not None:
+        _worker_pool.shutdown(cancel_futures=True)
+        _worker_pool = None
+
+
+def parallel_search(board, simulations, workers, seed=None, time_limit=None, config=SearchConfig(),
+                    should_stop=None):
+    """
+    Root parallelism: independent trees, one job per worker in the shared pool, with the root
+    statistics summed per move. More workers than MAX_WORKERS queue behind each other.
+    If should_stop() turns true, jobs not yet started are cancelled and None is returned;
+    jobs already running finish their share in the background.
+    """
+    from concurrent.futures import wait
+    base_seed = seed if seed is not None else random.randrange(2 ** 32)
+    if simulations is None:
+        shares = [None] * workers  # Each worker searches until the time limit
+    else:
+        shares = [simulations // workers + (1 if i < simulations % workers else 0) for i in range(workers)]
+    pool = get_worker_pool()
+    futures = [pool.submit(run_search, board, share, base_seed + i, time_limit, config)
+               for i, share in enumerate(shares) if share is None or share]
+
+    if should_stop is not None:
+        pending = set(futures)
+        while pending:
+            if should_stop():
+                for future in pending:
+                    future.cancel()
+                return None
+            pending = wait(pending, timeout=0.1).not_done
+
+    stats = {}
+    for future in futures:  # Merged in submission order, so ties resolve the same way every run
+        for move, (visits, wins) in future.result().items():
+            total_visits, total_wins = stats.get(move, (0, 0))
+            stats[move] = (total_visits + visits, total_wins + wins)
+    return stats
@@ -0,0 +1,115 @@
+"""
+Process-wide request and search metrics, rendered in the Prometheus text exposition format,
+plus on-demand cProfile capture for a single request.
+"""
+import cProfile
+import io
+import pstats
+import threading
+
+# Upper bounds (seconds) of the request latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# SearchStats counters summed over every search, with their help text
+SEARCH_COUNTERS = {
+    "nodes_created": "MCTS nodes created",
+    "transpositions": "MCTS expansions that reached an existing node",
+    "rollouts": "MCTS rollouts run",
+    "rollout_moves": "Moves played in MCTS rollouts",
+    "selection_seconds": "Seconds spent selecting MCTS leaves",
+    "movegen_seconds": "Seconds spent generating moves for new MCTS nodes",
+    "copy_seconds": "Seconds spent copying positions for new MCTS nodes",
+    "rollout_seconds": "Seconds spent in MCTS rollouts",
+    "backprop_seconds": "Seconds spent backpropagating MCTS results",
+}
+
+
+class Metrics:
+    """
+    Thread-safe counters: request counts and latency histograms per method and route,
+    and totals of every recorded SearchStats.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()  # Searches report from executor threads
+        self.requests = {}  # (method, path, status) -> count
+        self.latency = {}  # (method, path) -> [bucket counts..., total seconds, count]
+        self.searches = 0
+        self.search_totals = dict.fromkeys(SEARCH_COUNTERS, 0)
+
+    def observe_request(self, method, path, status, seconds):
+        with self.lock:
+            key = (method, path, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            histogram = self.latency.get((method, path))
+            if histogram is None:
+                histogram = self.latency[(method, path)] = [0] * (len(LATENCY_BUCKETS) + 2)
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    histogram[i] += 1
+            histogram[-2] += seconds
+            histogram[-1] += 1
+
+    def observe_search(self, stats):
+        with self.lock:
+            self.searches += 1
+            for name in SEARCH_COUNTERS:
+                self.search_totals[name] += getattr(stats, name)
+
+    def render(self, gauges=None, counters=None):
+        """
+        Returns every metric in the Prometheus text format.
+        gauges and counters map extra metric names to (help text, current value); counter
+        names end in _total.
+        """
+        lines = [
+            "# HELP freecell_requests_total HTTP requests by method, route and status",
+            "# TYPE freecell_requests_total counter",
+        ]
+        with self.lock:
+            for (method, path, status), count in sorted(self.requests.items()):
+                lines.append(f'freecell_requests_total{{method="{method}",path="{path}",status="{status}"}} {count}')
+
+            lines.append("# HELP freecell_request_duration_seconds HTTP request latency by method and route")
+            lines.append("# TYPE freecell_request_duration_seconds histogram")
+            for (method, path), histogram in sorted(self.latency.items()):
+                labels = f'method="{method}",path="{path}"'
+                for bound, count in zip(LATENCY_BUCKETS, histogram):
+                    lines.append(f'freecell_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'freecell_request_duration_seconds_bucket{{{labels},le="+Inf"}} {histogram[-1]}')
+                lines.append(f"freecell_request_duration_seconds_sum{{{labels}}} {histogram[-2]}")
+                lines.append(f"freecell_request_duration_seconds_count{{{labels}}} {histogram[-1]}")
+
+            lines.append("# HELP freecell_searches_total MCTS searches run")
+            lines.append("# TYPE freecell_searches_total counter")
+            lines.append(f"freecell_searches_total {self.searches}")
+            for name, help_text in SEARCH_COUNTERS.items():
+                lines.append(f"# HELP freecell_search_{name}_total {help_text}")
+                lines.append(f"# TYPE freecell_search_{name}_total counter")
+                lines.append(f"freecell_search_{name}_total {self.search_totals[name]}")
+
+        for kind, metrics in (("gauge", gauges), ("counter", counters)):
+            for name, (help_text, value) in (metrics or {}).items():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class Profiler:
+    """
+    cProfile capture for a single request. Samples accumulate over every call(), which may
+    run in different threads one after another.
+    """
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def call(self, fn, *args, **kwargs):
+        return self.profile.runcall(fn, *args, **kwargs)
+
+    def report(self, limit=30):
+        # The limit most expensive functions by cumulative time
+        out = io.StringIO()
+        pstats.Stats(self.profile, stream=out).sort_stats("cumulative").print_stats(limit)
+        return out.getvalue()
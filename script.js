@@ -7,12 +7,15 @@ document.addEventListener('DOMContentLoaded', () => {
     // Action Buttons
     const newGameBtn = document.getElementById('new-game-btn');
     const computerPlayBtn = document.getElementById('computer-play-btn');
+    const hintBtn = document.getElementById('hint-btn');
     const undoBtn = document.getElementById('undo-btn');
     const quitBtn = document.getElementById('quit-btn');
 
     // Global state for click-to-move
-    let selectedSource = null; // { type: 'column' | 'free', index: number, card: string }
+    let selectedSource = null; // { type: 'column' | 'free', index: number, card: string, count: number }
     let selectedCardElement = null; // The DOM element of the selected card
+    let hintSource = null; // EventSource of a running streaming hint
+    let currentVersion = null; // Server game version last rendered, so unchanged boards are not resent
 
     // Helper to display messages
     function displayMessage(message, isError = false) {
@@ -84,10 +87,11 @@ document.addEventListener('DOMContentLoaded', () => {
             // deselectCard() will be called after attemptMove completes and renderGameState is called
         } else {
             // No card selected yet, this is the first click (source selection)
-            // Only allow selecting the bottom-most card in a column
-            if (clickedSourceType === 'column' && clickedCardElement.nextElementSibling) {
-                displayMessage('You can only select the bottom-most card in a column.', true);
-                return;
+            // Selecting a card higher up in a column picks up every card below it as a run
+            let count = 1;
+            if (clickedSourceType === 'column') {
+                const columnLength = clickedCardElement.parentElement.querySelectorAll('.card').length;
+                count = columnLength - parseInt(clickedCardElement.dataset.cardPosition);
             }
             // Home cells are not valid sources in FreeCell
             if (clickedSourceType === 'home') {
@@ -96,10 +100,11 @@ document.addEventListener('DOMContentLoaded', () => {
             }
 
 
-            selectedSource = { type: clickedSourceType, index: clickedSourceIndex, card: cardValue };
+            selectedSource = { type: clickedSourceType, index: clickedSourceIndex, card: cardValue, count: count };
             selectedCardElement = clickedCardElement;
             selectedCardElement.classList.add('selected-card'); // Add visual highlight
-            displayMessage(`Selected ${cardValue} from ${clickedSourceType} ${clickedSourceIndex}. Now click a destination.`);
+            const runText = count > 1 ? ` and the ${count - 1} card(s) below it` : '';
+            displayMessage(`Selected ${cardValue}${runText} from ${clickedSourceType} ${clickedSourceIndex}. Now click a destination.`);
         }
     }
 
@@ -117,30 +122,40 @@ document.addEventListener('DOMContentLoaded', () => {
         // deselectCard() will be called after attemptMove completes and renderGameState is called
     }
 
-    // Function to perform the move via API
+    // Stop a running streaming hint; closing the stream also stops the search on the server
+    function stopHint() {
+        if (hintSource) {
+            hintSource.close();
+            hintSource = null;
+            hintBtn.textContent = 'Hint';
+        }
+    }
+
+    // Function to perform the move via API; one round trip returns the new board and win flag
     async function attemptMove(source, destination) {
+        stopHint();
         let success = false;
         let message = 'Invalid move combination.';
-        let endpoint = '';
-        let params = new URLSearchParams();
+        let move = null;
+        let gameState = null;
 
         if (source.type === 'column' && destination.type === 'column') {
-            endpoint = '/move_column';
-            params.append('src', source.index);
-            params.append('dst', destination.index);
+            move = source.count > 1
+                ? ['sequence_to_column', source.index, destination.index, source.count]
+                : ['column_to_column', source.index, destination.index];
+        } else if (source.count > 1) {
+            // Runs of several cards can only move between columns
+            displayMessage('Only a single card can be moved there.', true);
+            await renderGameState(); // Re-render to clear selection
+            return;
         } else if (source.type === 'column' && destination.type === 'free') {
-            endpoint = '/move_to_free';
-            params.append('src', source.index);
+            move = ['column_to_free', source.index];
         } else if (source.type === 'free' && destination.type === 'column') {
-            endpoint = '/move_from_free';
-            params.append('src', source.index);
-            params.append('dst', destination.index);
+            move = ['free_to_column', source.index, destination.index];
         } else if (source.type === 'column' && destination.type === 'home') {
-            endpoint = '/column_to_home';
-            params.append('src', source.index);
+            move = ['column_to_home', source.index];
         } else if (source.type === 'free' && destination.type === 'home') {
-            endpoint = '/free_to_home';
-            params.append('src', source.index);
+            move = ['free_to_home', source.index];
         } else {
             displayMessage(message, true);
             await renderGameState(); // Re-render to clear selection
@@ -148,11 +163,16 @@ document.addEventListener('DOMContentLoaded', () => {
         }
 
         try {
-            const response = await fetch(`${endpoint}?${params.toString()}`, { method: 'POST' });
+            const response = await fetch('/move', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ move: move, since: currentVersion }),
+            });
             if (!response.ok) {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
-            success = await response.json();
+            gameState = await response.json();
+            success = gameState.ok;
             message = success ? 'Move successful!' : 'Invalid move. Please try again.';
         } catch (error) {
             console.error('Error performing move:', error);
@@ -161,156 +181,169 @@ document.addEventListener('DOMContentLoaded', () => {
         }
 
         displayMessage(message, !success);
-        await renderGameState(); // Re-render to update board and clear selection
+        await renderGameState(gameState); // Re-render to update board and clear selection
     }
 
 
-    // Function to render the game state
-    async function renderGameState() {
+    // Function to render the game state returned by any action, fetching it if none is given
+    async function renderGameState(gameState = null) {
         try {
-            const response = await fetch('/get_game_state');
-            if (!response.ok) {
-                throw new Error(`HTTP error! status: ${response.status}`);
+            if (gameState === null) {
+                const response = await fetch('/get_game_state');
+                if (!response.ok) {
+                    throw new Error(`HTTP error! status: ${response.status}`);
+                }
+                gameState = await response.json();
             }
-            const gameState = await response.json();
+            currentVersion = gameState.version;
 
-            // Clear previous content and re-add empty slots for click targets
-            freeCellsDiv.innerHTML = '';
-            for (let i = 0; i < 4; i++) {
-                const emptySlot = document.createElement('div');
-                emptySlot.className = 'empty-slot';
-                emptySlot.dataset.destinationType = 'free';
-                emptySlot.dataset.destinationIndex = i;
-                emptySlot.addEventListener('click', handleEmptySlotClick);
-                freeCellsDiv.appendChild(emptySlot);
+            // The board is left out when the client's version is already current
+            if (gameState.table !== undefined) {
+                renderBoard(gameState);
             }
 
-            homeCellsDiv.innerHTML = '';
-            for (let i = 0; i < 4; i++) {
-                const emptySlot = document.createElement('div');
-                emptySlot.className = 'empty-slot';
-                emptySlot.dataset.destinationType = 'home';
-                emptySlot.dataset.destinationIndex = i;
-                emptySlot.addEventListener('click', handleEmptySlotClick);
-                homeCellsDiv.appendChild(emptySlot);
+            // Check if game is won
+            if (gameState.won) {
+                displayMessage('Congratulations! You won the game!', false);
             }
 
-            tableColumnsDiv.innerHTML = '';
+            // After rendering, deselect any card
+            deselectCard();
+
+        } catch (error) {
+            console.error('Error rendering game state:', error);
+            displayMessage('Failed to load game state. Please try starting a new game.', true);
+        }
+    }
+
+    function renderBoard(gameState) {
+        // Clear previous content and re-add empty slots for click targets
+        freeCellsDiv.innerHTML = '';
+        for (let i = 0; i < 4; i++) {
+            const emptySlot = document.createElement('div');
+            emptySlot.className = 'empty-slot';
+            emptySlot.dataset.destinationType = 'free';
+            emptySlot.dataset.destinationIndex = i;
+            emptySlot.addEventListener('click', handleEmptySlotClick);
+            freeCellsDiv.appendChild(emptySlot);
+        }
+
+        homeCellsDiv.innerHTML = '';
+        for (let i = 0; i < 4; i++) {
+            const emptySlot = document.createElement('div');
+            emptySlot.className = 'empty-slot';
+            emptySlot.dataset.destinationType = 'home';
+            emptySlot.dataset.destinationIndex = i;
+            emptySlot.addEventListener('click', handleEmptySlotClick);
+            homeCellsDiv.appendChild(emptySlot);
+        }
+
+        tableColumnsDiv.innerHTML = '';
 
 
-            // Render Free Cells
-            if (gameState.free && gameState.free.length > 0) {
-                gameState.free.forEach((card, index) => {
+        // Render Free Cells
+        if (gameState.free && gameState.free.length > 0) {
+            gameState.free.forEach((card, index) => {
+                const cardDetails = getCardDetails(card);
+                const cardDiv = document.createElement('div');
+                cardDiv.className = `card ${cardDetails.suitColorClass}`;
+                cardDiv.dataset.card = card;
+                cardDiv.dataset.sourceType = 'free';
+                cardDiv.dataset.sourceIndex = index; // Index within the free cells array
+                cardDiv.innerHTML = `<span class="card-rank">${cardDetails.rank}</span><span class="card-suit">${cardDetails.suitSymbol}</span>`;
+                cardDiv.addEventListener('click', handleCardClick);
+                // Replace the empty slot at this index with the card
+                if (freeCellsDiv.children[index]) {
+                    freeCellsDiv.children[index].replaceWith(cardDiv);
+                } else {
+                    freeCellsDiv.appendChild(cardDiv); // Fallback if somehow slot not there
+                }
+            });
+        }
+
+        // Render Home Cells
+        if (gameState.home && gameState.home.length > 0) {
+            gameState.home.forEach((homeStack, index) => {
+                if (homeStack.length > 1) { // If there's a card on top of "0"
+                    const card = homeStack[homeStack.length - 1];
                     const cardDetails = getCardDetails(card);
                     const cardDiv = document.createElement('div');
                     cardDiv.className = `card ${cardDetails.suitColorClass}`;
                     cardDiv.dataset.card = card;
-                    cardDiv.dataset.sourceType = 'free';
-                    cardDiv.dataset.sourceIndex = index; // Index within the free cells array
+                    // Home cells are typically not sources in FreeCell, so no sourceType/sourceIndex needed
+                    // BUT they can be destinations for a successor card
+                    cardDiv.dataset.destinationType = 'home'; // Add destination type
+                    cardDiv.dataset.destinationIndex = index; // Add destination index
+                    cardDiv.dataset.sourceType = 'home'; // Add source type for click handling
+                    cardDiv.dataset.sourceIndex = index; // Add source index for click handling
                     cardDiv.innerHTML = `<span class="card-rank">${cardDetails.rank}</span><span class="card-suit">${cardDetails.suitSymbol}</span>`;
-                    cardDiv.addEventListener('click', handleCardClick);
+                    cardDiv.addEventListener('click', handleCardClick); // Add click listener
                     // Replace the empty slot at this index with the card
-                    if (freeCellsDiv.children[index]) {
-                        freeCellsDiv.children[index].replaceWith(cardDiv);
+                    if (homeCellsDiv.children[index]) {
+                        homeCellsDiv.children[index].replaceWith(cardDiv);
                     } else {
-                        freeCellsDiv.appendChild(cardDiv); // Fallback if somehow slot not there
+                        homeCellsDiv.appendChild(cardDiv); // Fallback
                     }
-                });
-            }
+                }
+            });
+        }
 
-            // Render Home Cells
-            if (gameState.home && gameState.home.length > 0) {
-                gameState.home.forEach((homeStack, index) => {
-                    if (homeStack.length > 1) { // If there's a card on top of "0"
-                        const card = homeStack[homeStack.length - 1];
+        // Render Table Columns
+        if (gameState.table && gameState.table.length > 0) {
+            gameState.table.forEach((column, colIndex) => {
+                const columnDiv = document.createElement('div');
+                columnDiv.className = 'column';
+
+                const colHeader = document.createElement('h3');
+                colHeader.className = 'column-header';
+                colHeader.textContent = `Col ${colIndex}`;
+                columnDiv.appendChild(colHeader);
+
+                if (column.length > 0) {
+                    // If column has cards, only cards are clickable for source/destination
+                    column.forEach((card, cardPos) => {
                         const cardDetails = getCardDetails(card);
                         const cardDiv = document.createElement('div');
                         cardDiv.className = `card ${cardDetails.suitColorClass}`;
                         cardDiv.dataset.card = card;
-                        // Home cells are typically not sources in FreeCell, so no sourceType/sourceIndex needed
-                        // BUT they can be destinations for a successor card
-                        cardDiv.dataset.destinationType = 'home'; // Add destination type
-                        cardDiv.dataset.destinationIndex = index; // Add destination index
-                        cardDiv.dataset.sourceType = 'home'; // Add source type for click handling
-                        cardDiv.dataset.sourceIndex = index; // Add source index for click handling
+                        cardDiv.dataset.sourceType = 'column';
+                        cardDiv.dataset.sourceIndex = colIndex;
+                        cardDiv.dataset.cardPosition = cardPos; // Position within the column
                         cardDiv.innerHTML = `<span class="card-rank">${cardDetails.rank}</span><span class="card-suit">${cardDetails.suitSymbol}</span>`;
-                        cardDiv.addEventListener('click', handleCardClick); // Add click listener
-                        // Replace the empty slot at this index with the card
-                        if (homeCellsDiv.children[index]) {
-                            homeCellsDiv.children[index].replaceWith(cardDiv);
-                        } else {
-                            homeCellsDiv.appendChild(cardDiv); // Fallback
-                        }
-                    }
-                });
-            }
-
-            // Render Table Columns
-            if (gameState.table && gameState.table.length > 0) {
-                gameState.table.forEach((column, colIndex) => {
-                    const columnDiv = document.createElement('div');
-                    columnDiv.className = 'column';
-
-                    const colHeader = document.createElement('h3');
-                    colHeader.className = 'column-header';
-                    colHeader.textContent = `Col ${colIndex}`;
-                    columnDiv.appendChild(colHeader);
-
-                    if (column.length > 0) {
-                        // If column has cards, only cards are clickable for source/destination
-                        column.forEach((card, cardPos) => {
-                            const cardDetails = getCardDetails(card);
-                            const cardDiv = document.createElement('div');
-                            cardDiv.className = `card ${cardDetails.suitColorClass}`;
-                            cardDiv.dataset.card = card;
-                            cardDiv.dataset.sourceType = 'column';
-                            cardDiv.dataset.sourceIndex = colIndex;
-                            cardDiv.dataset.cardPosition = cardPos; // Position within the column
-                            cardDiv.innerHTML = `<span class="card-rank">${cardDetails.rank}</span><span class="card-suit">${cardDetails.suitSymbol}</span>`;
-                            cardDiv.addEventListener('click', handleCardClick);
-                            columnDiv.appendChild(cardDiv);
-                        });
-                    } else {
-                        // If column is empty, the columnDiv itself is the click target for destination
-                        columnDiv.classList.add('empty-column');
-                        columnDiv.dataset.destinationType = 'column';
-                        columnDiv.dataset.destinationIndex = colIndex;
-                        columnDiv.addEventListener('click', handleEmptySlotClick);
-
-                        const emptySlot = document.createElement('div');
-                        emptySlot.className = 'text-center text-gray-400 text-sm mt-4';
-                        emptySlot.textContent = 'Empty';
-                        columnDiv.appendChild(emptySlot);
-                    }
-                    tableColumnsDiv.appendChild(columnDiv);
-                });
-            } else {
-                tableColumnsDiv.textContent = 'No columns to display.';
-                tableColumnsDiv.classList.add('text-gray-500', 'text-center');
-            }
-
-            // Check if game is won
-            const isGameWonResponse = await fetch('/is_game_won');
-            const isWon = await isGameWonResponse.json();
-            if (isWon) {
-                displayMessage('Congratulations! You won the game!', false);
-            }
-
-            // After rendering, deselect any card
-            deselectCard();
-
-        } catch (error) {
-            console.error('Error rendering game state:', error);
-            displayMessage('Failed to load game state. Please try starting a new game.', true);
+                        cardDiv.addEventListener('click', handleCardClick);
+                        columnDiv.appendChild(cardDiv);
+                    });
+                } else {
+                    // If column is empty, the columnDiv itself is the click target for destination
+                    columnDiv.classList.add('empty-column');
+                    columnDiv.dataset.destinationType = 'column';
+                    columnDiv.dataset.destinationIndex = colIndex;
+                    columnDiv.addEventListener('click', handleEmptySlotClick);
+
+                    const emptySlot = document.createElement('div');
+                    emptySlot.className = 'text-center text-gray-400 text-sm mt-4';
+                    emptySlot.textContent = 'Empty';
+                    columnDiv.appendChild(emptySlot);
+                }
+                tableColumnsDiv.appendChild(columnDiv);
+            });
+        } else {
+            tableColumnsDiv.textContent = 'No columns to display.';
+            tableColumnsDiv.classList.add('text-gray-500', 'text-center');
         }
     }
 
     // Event Listeners for Actions
     newGameBtn.addEventListener('click', async () => {
+        stopHint();
         try {
-            await fetch('/start', { method: 'POST' });
+            const response = await fetch('/start', { method: 'POST' });
+            if (!response.ok) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
+            const gameState = await response.json();
             displayMessage('New game started!');
-            await renderGameState();
+            await renderGameState(gameState);
         } catch (error) {
             console.error('Error starting new game:', error);
             displayMessage('Failed to start new game.', true);
@@ -318,39 +351,63 @@ document.addEventListener('DOMContentLoaded', () => {
     });
 
     computerPlayBtn.addEventListener('click', async () => {
+        stopHint();
         displayMessage('Computer is thinking...', false);
         try {
             const response = await fetch('/computer_play?sim=100'); // Pass simulations count
             if (!response.ok) {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
-            const bestMove = await response.json();
+            const gameState = await response.json();
 
-            if (bestMove) {
-                displayMessage(`Computer made move: ${JSON.stringify(bestMove)}`);
+            if (gameState.move) {
+                const homed = gameState.played.length - 1;
+                displayMessage(`Computer made move: ${JSON.stringify(gameState.move)}` +
+                    (homed > 0 ? ` (then sent ${homed} card${homed > 1 ? 's' : ''} home)` : ''));
             } else {
                 displayMessage('Computer could not find a valid move or game is stuck.', true);
             }
-            await renderGameState();
+            await renderGameState(gameState);
         } catch (error) {
             console.error('Error during computer play:', error);
             displayMessage('Failed for computer to make a move.', true);
         }
     });
 
+    hintBtn.addEventListener('click', () => {
+        // A second click stops the search once the hint is good enough
+        if (hintSource) {
+            stopHint();
+            displayMessage('Hint stopped.');
+            return;
+        }
+        hintSource = new EventSource('/hint_stream?time_ms=10000&every=100');
+        hintBtn.textContent = 'Stop Hint';
+        displayMessage('Looking for a hint...');
+        hintSource.onmessage = (event) => {
+            const hint = JSON.parse(event.data);
+            // Rollouts earn partial credit for cards sent home, so this is an average reward rather than a win rate
+            const score = hint.visits ? (100 * hint.wins / hint.visits).toFixed(1) : '0.0';
+            displayMessage(`Hint: ${JSON.stringify(hint.move)} (${hint.visits} visits, score ${score}%, ${hint.simulations} simulations)`);
+        };
+        hintSource.addEventListener('done', () => stopHint());
+        hintSource.onerror = () => stopHint();
+    });
+
     undoBtn.addEventListener('click', async () => {
+        stopHint();
         try {
             const response = await fetch('/undo', { method: 'POST' });
             if (!response.ok) {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
-            const success = await response.json();
-            if (success) {
+            const gameState = await response.json();
+            if (gameState.ok) {
                 displayMessage('Undo successful!');
             } else {
                 displayMessage('Cannot undo further.', true);
             }
-            await renderGameState();
+            await renderGameState(gameState);
         } catch (error) {
             console.error('Error during undo:', error);
             displayMessage('Failed to undo move.', true);
@@ -358,6 +415,7 @@ document.addEventListener('DOMContentLoaded', () => {
     });
 
     quitBtn.addEventListener('click', () => {
+        stopHint();
         displayMessage('Game quit. Goodbye!', false);
         // Optionally, reset UI or disable controls
         freeCellsDiv.innerHTML = '';
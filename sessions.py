@@ -0,0 +1,175 @@
+import asyncio
+import os
+import pickle
+import re
+import secrets
+import sys
+import time
+from collections import OrderedDict
+
+from engine import Game, reachable_nodes
+
+# Approximate bytes held by one MCTSNode with its Board and move lists (measured with tracemalloc)
+SEARCH_NODE_BYTES = 1300
+
+_SESSION_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+def new_session_id():
+    return secrets.token_hex(16)
+
+
+def is_valid_session_id(session_id):
+    # Session ids double as file names in the on-disk store, so only accept our own format
+    return bool(session_id) and _SESSION_ID.match(session_id) is not None
+
+
+def estimate_game_bytes(game):
+    # Card strings are shared constants, so only the containers and the search tree count
+    size = sys.getsizeof(game.__dict__)
+    for piles in (game.table, game.home):
+        size += sys.getsizeof(piles) + sum(sys.getsizeof(pile) for pile in piles)
+    size += sys.getsizeof(game.free) + sys.getsizeof(game.history)
+    size += len(game.history_moves()) * sys.getsizeof((None, None))
+    if game.search_root is not None:
+        size += len(reachable_nodes(game.search_root)) * SEARCH_NODE_BYTES
+    return size
+
+
+class Session:
+    def __init__(self, session_id, game):
+        self.session_id = session_id
+        self.game = game
+        self.lock = asyncio.Lock()  # Serializes requests for the same game
+        self.last_used = time.monotonic()
+        self.size = estimate_game_bytes(game)
+
+
+class SessionRegistry:
+    """
+    Bounded in-memory registry of games keyed by session id.
+    Sessions are evicted least-recently-used first when the registry exceeds max_sessions
+    or max_bytes, and after ttl seconds idle. With store_dir set, evicted games are
+    pickled there and transparently rehydrated on the next request. Stored games are deleted
+    after store_ttl seconds, and beyond max_stored files the oldest go first; the store is
+    swept at startup and then at most every sweep_interval seconds as games are stored.
+    """
+
+    def __init__(self, max_sessions=20000, max_bytes=512 * 1024 * 1024, ttl=3600, store_dir=None,
+                 max_tree_nodes=2000, store_ttl=7 * 24 * 3600, max_stored=100000, sweep_interval=600):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.store_dir = store_dir
+        self.max_tree_nodes = max_tree_nodes  # Per-session MCTS tree cap
+        self.store_ttl = store_ttl
+        self.max_stored = max_stored
+        self.sweep_interval = sweep_interval
+        self.last_sweep = None
+        self.sessions = OrderedDict()
+        self.total_bytes = 0
+        self.evictions = 0
+        self.rehydrations = 0
+        if store_dir:
+            os.makedirs(store_dir, exist_ok=True)
+            self.sweep_store()
+
+    def get(self, session_id):
+        session = self.sessions.get(session_id)
+        if session is None:
+            game = self._load(session_id)
+            if game is None:
+                game = Game()
+            game.max_tree_nodes = self.max_tree_nodes
+            session = Session(session_id, game)
+            self.sessions[session_id] = session
+            self.total_bytes += session.size
+        else:
+            self.sessions.move_to_end(session_id)
+        session.last_used = time.monotonic()
+        self._evict(keep=session_id)
+        return session
+
+    def release(self, session):
+        # Re-measure after a request, since moves and searches change the game's footprint
+        if self.sessions.get(session.session_id) is session:
+            size = estimate_game_bytes(session.game)
+            self.total_bytes += size - session.size
+            session.size = size
+            self._evict(keep=session.session_id)
+
+    def stats(self):
+        return {
+            "sessions": len(self.sessions),
+            "total_bytes": self.total_bytes,
+            "bytes_per_session": self.total_bytes // len(self.sessions) if self.sessions else 0,
+            "max_sessions": self.max_sessions,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+            "rehydrations": self.rehydrations,
+        }
+
+    def _evict(self, keep=None):
+        now = time.monotonic()
+        # Oldest sessions come first; busy ones go to the back rather than being pulled out from under a request
+        for _ in range(len(self.sessions)):
+            session_id, session = next(iter(self.sessions.items()))
+            over_limit = len(self.sessions) > self.max_sessions or self.total_bytes > self.max_bytes
+            expired = now - session.last_used > self.ttl
+            if not over_limit and not expired:
+                break
+            if session_id == keep or session.lock.locked():
+                self.sessions.move_to_end(session_id)
+                continue
+            del self.sessions[session_id]
+            self.total_bytes -= session.size
+            self.evictions += 1
+            self._store(session)
+
+    def _path(self, session_id):
+        return os.path.join(self.store_dir, session_id + ".pkl")
+
+    def _store(self, session):
+        if self.store_dir:
+            with open(self._path(session.session_id), "wb") as f:
+                pickle.dump(session.game, f, protocol=pickle.HIGHEST_PROTOCOL)
+            if time.monotonic() - self.last_sweep > self.sweep_interval:
+                self.sweep_store()
+
+    def sweep_store(self):
+        """
+        Deletes stored games of abandoned sessions: those older than store_ttl, then the
+        oldest ones beyond max_stored. Returns the number deleted.
+        """
+        self.last_sweep = time.monotonic()
+        stored = []
+        with os.scandir(self.store_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith(".pkl"):
+                    try:
+                        stored.append((entry.stat().st_mtime, entry.path))
+                    except OSError:
+                        continue  # Rehydrated meanwhile
+        stored.sort()
+        cutoff = time.time() - self.store_ttl
+        expired = sum(1 for mtime, _ in stored if mtime < cutoff)
+        doomed = stored[:max(expired, len(stored) - self.max_stored)]
+        for _, path in doomed:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        return len(doomed)
+
+    def _load(self, session_id):
+        if not self.store_dir:
+            return None
+        path = self._path(session_id)
+        try:
+            with open(path, "rb") as f:
+                game = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        os.remove(path)
+        self.rehydrations += 1
+        return game
@@ -0,0 +1,195 @@
+import heapq
+import itertools
+import time
+from collections import namedtuple
+
+from board import RANK
+
+# moves is the full move list when solved, otherwise None.
+# exhausted is True when every reachable position was searched, so an unsolved
+# result proves the deal unwinnable.
+# best_home and best_moves are the most cards home on any position reached and the moves
+# reaching it: the partial result of a search that ran out of budget.
+SolveResult = namedtuple("SolveResult", "solved moves nodes elapsed exhausted best_home best_moves")
+
+# Weight on the heuristic; above 1 trades optimality for much faster solves
+HEURISTIC_WEIGHT = 3
+
+# Positions kept per depth by beam_solve
+BEAM_WIDTH = 500
+
+# Approximate bytes beam_solve holds per frontier Board, per path link and per seen key
+# (measured with tracemalloc, plus a quarter for allocator overhead), used to keep it
+# under its memory ceiling
+BOARD_BYTES = 750
+LINK_BYTES = 250
+KEY_BYTES = 110
+
+
+def heuristic(board):
+    # Cards still to go home, plus every card that sits on a lower card in its column
+    # (it has to move at least once more before the card below can go home)
+    estimate = 52 - sum(board.home)
+    for column in board.columns:
+        lowest = 14
+        for card in column:
+            rank = RANK[card]
+            if rank > lowest:
+                estimate += 1
+            else:
+                lowest = rank
+    return estimate + len(board.free)
+
+
+def solve(board, max_nodes=200000, time_limit=None):
+    """
+    Weighted A* over Boards with a transposition table keyed by Board.key.
+    Stops after max_nodes expansions or time_limit seconds.
+    Provable dead ends (Board.is_dead_end) are never queued.
+    """
+    start = time.perf_counter()
+    deadline = start + time_limit if time_limit is not None else None
+    counter = itertools.count()
+    # Nodes are (board, parent_node, moves) so paths are only rebuilt for the solution.
+    # Every step includes its safe-to-home closure, so those positions are never nodes.
+    board, auto_moves = board.autoplay()
+    root = (board, None, auto_moves)
+    if board.is_dead_end():
+        return SolveResult(False, None, 0, time.perf_counter() - start, True, board.cards_home(), auto_moves)
+    open_list = [(HEURISTIC_WEIGHT * heuristic(board), next(counter), 0, root)]
+    seen = {board.key: 0}
+    nodes = 0
+    best = root
+
+    def result(solved, exhausted):
+        best_moves = _path(best)
+        return SolveResult(solved, best_moves if solved else None, nodes, time.perf_counter() - start,
+                           exhausted, best[0].cards_home(), best_moves)
+
+    while open_list:
+        if nodes >= max_nodes or (deadline is not None and time.perf_counter() > deadline):
+            return result(False, False)
+        _, _, g, node = heapq.heappop(open_list)
+        current = node[0]
+        if current.cards_home() > best[0].cards_home():
+            best = node
+        if current.is_won():
+            return result(True, False)
+        nodes += 1
+        for move in current.legal_moves():
+            child, moves = current.play_closed(move)
+            if child.key in seen and seen[child.key] <= g + 1:
+                continue
+            seen[child.key] = g + 1
+            if child.is_dead_end():
+                continue
+            f = g + 1 + HEURISTIC_WEIGHT * heuristic(child)
+            heapq.heappush(open_list, (f, next(counter), g + 1, (child, node, moves)))
+
+    return result(False, True)
+
+
+def beam_solve(board, beam_width=BEAM_WIDTH, memory_mb=None, max_nodes=200000, time_limit=None,
+               progress=None):
+    """
+    Memory-bounded beam search: expands the frontier one move deeper at a time and keeps the
+    beam_width children with the best heuristic. Only the frontier holds Boards; earlier
+    positions survive only as move lists on the paths leading to it.
+    With memory_mb, the estimated footprint stays under that many megabytes: seen position
+    keys are forgotten first, then the beam is halved, and a beam of one that still does
+    not fit stops the search with its best partial result.
+    progress(result), if given, receives the partial SolveResult after every depth.
+    Returns a SolveResult; exhausted is only True if nothing was ever cut from the beam.
+    """
+    start = time.perf_counter()
+    deadline = start + time_limit if time_limit is not None else None
+    ceiling = memory_mb * 2 ** 20 if memory_mb is not None else None
+    # Frontier entries are (board, link); a link is (parent link, moves) so the moves of a
+    # path are kept without its Boards
+    board, auto_moves = board.autoplay()
+    root = (board, (None, auto_moves))
+    frontier = [] if board.is_dead_end() else [root]
+    seen = {board.key}
+    seen_limit = None  # Seen keys that fit beside the frontier under the ceiling
+    nodes = 0
+    best = root
+    complete = True  # No position has been cut from the beam or forgotten
+
+    def result(solved, exhausted):
+        best_moves = _link_path(best[1])
+        return SolveResult(solved, best_moves if solved else None, nodes, time.perf_counter() - start,
+                           exhausted, best[0].cards_home(), best_moves)
+
+    if board.is_won():
+        return result(True, False)
+    while frontier:
+        if ceiling is not None:
+            # The frontier and the next depth's heap plus the links still on a frontier path;
+            # seen keys get whatever is left
+            footprint = 2 * beam_width * BOARD_BYTES + _live_links(frontier) * LINK_BYTES
+            while footprint > ceiling:
+                if beam_width == 1:
+                    return result(False, False)
+                beam_width = (beam_width + 1) // 2
+                frontier = frontier[:beam_width]  # Best first
+                footprint = 2 * beam_width * BOARD_BYTES + _live_links(frontier) * LINK_BYTES
+            seen_limit = (ceiling - footprint) // KEY_BYTES
+        # The beam_width best children, by heuristic, as a bounded max-heap
+        heap = []
+        for current, link in frontier:
+            if nodes >= max_nodes or (deadline is not None and time.perf_counter() > deadline):
+                return result(False, False)
+            nodes += 1
+            for move in current.legal_moves():
+                child, moves = current.play_closed(move)
+                if child.key in seen:
+                    continue
+                if seen_limit is not None and len(seen) >= seen_limit:
+                    seen.clear()
+                    complete = False
+                seen.add(child.key)
+                if child.is_won():
+                    best = (child, (link, moves))
+                    return result(True, False)
+                if child.is_dead_end():
+                    continue
+                entry = (-heuristic(child), child.key, child, link, moves)
+                if len(heap) < beam_width:
+                    heapq.heappush(heap, entry)
+                else:
+                    complete = False
+                    if entry > heap[0]:
+                        heapq.heapreplace(heap, entry)
+        frontier = [(child, (link, moves)) for _, _, child, link, moves in sorted(heap, reverse=True)]
+        for entry in frontier:
+            if entry[0].cards_home() > best[0].cards_home():
+                best = entry
+        if progress is not None:
+            progress(result(False, False))
+    return result(False, complete)
+
+
+def _path(node):
+    segments = []
+    while node is not None:
+        segments.append(node[2])
+        node = node[1]
+    return [move for segment in reversed(segments) for move in segment]
+
+
+def _live_links(frontier):
+    # Path links reachable from the frontier; paths share their prefixes, so each is counted once
+    live = set()
+    for _, link in frontier:
+        while link is not None and id(link) not in live:
+            live.add(id(link))
+            link = link[0]
+    return len(live)
+
+
+def _link_path(link):
+    segments = []
+    while link is not None:
+        segments.append(link[1])
+        link = link[0]
+    return [move for segment in reversed(segments) for move in segment]
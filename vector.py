@@ -0,0 +1,281 @@
+"""
+NumPy rollout engine: many boards held as arrays and played forward together, so one call
+runs hundreds of random rollouts in vectorized steps.
+
+Only needed for batched rollouts (SearchConfig.rollout_batch > 1); the rest of the solver
+runs without NumPy.
+"""
+import numpy as np
+
+from board import Board, CAN_STACK, RANK, SUIT
+from engine import Game, SHAPED_REWARD_CAP
+
+# Tallest possible column: 7 dealt cards with a Queen-to-Ace run on top
+MAX_HEIGHT = 19
+
+# Card index used for "no card"; the lookup tables below are padded with it
+NO_CARD = 52
+
+RANK_T = np.array(RANK + (0,))
+SUIT_T = np.array(SUIT + (0,))
+# STACK_T[card, top] is True when card may be placed on top in a column
+STACK_T = np.zeros((53, 53), dtype=bool)
+STACK_T[:52, :52] = np.frombuffer(CAN_STACK, dtype=np.uint8).reshape(52, 52).astype(bool)
+
+# Move kinds, in Board's move vocabulary
+COLUMN_TO_COLUMN, COLUMN_TO_FREE, FREE_TO_COLUMN, COLUMN_TO_HOME, FREE_TO_HOME, SEQUENCE_TO_COLUMN = range(6)
+MOVE_NAMES = ('column_to_column', 'column_to_free', 'free_to_column', 'column_to_home', 'free_to_home',
+              'sequence_to_column')
+
+# Every move a batch can make gets a fixed slot: (kind, a, b) where a and b are the source
+# and destination column or free slot. legal_mask() returns one column per slot.
+_PAIRS = [(src, dst) for src in range(8) for dst in range(8) if src != dst]
+_SLOTS = ([(COLUMN_TO_COLUMN, src, dst) for src, dst in _PAIRS]
+          + [(COLUMN_TO_FREE, src, 0) for src in range(8)]
+          + [(FREE_TO_COLUMN, slot, dst) for slot in range(4) for dst in range(8)]
+          + [(COLUMN_TO_HOME, src, 0) for src in range(8)]
+          + [(FREE_TO_HOME, slot, 0) for slot in range(4)]
+          + [(SEQUENCE_TO_COLUMN, src, dst) for src, dst in _PAIRS])
+MOVE_KIND = np.array([kind for kind, _, _ in _SLOTS])
+MOVE_A = np.array([a for _, a, _ in _SLOTS])
+MOVE_B = np.array([b for _, _, b in _SLOTS])
+IS_HOME_MOVE = (MOVE_KIND == COLUMN_TO_HOME) | (MOVE_KIND == FREE_TO_HOME)
+_OFF_DIAGONAL = np.array([src * 8 + dst for src, dst in _PAIRS])
+
+
+class BoardBatch:
+    """
+    N positions as arrays: cols (N, 8, MAX_HEIGHT) cards bottom first, heights (N, 8),
+    free (N, 4) cards with NO_CARD for empty cells (in no particular order) and home (N, 4)
+    foundation heights by suit.
+    """
+
+    def __init__(self, cols, heights, free, home):
+        self.cols = cols
+        self.heights = heights
+        self.free = free
+        self.home = home
+
+    @classmethod
+    def from_boards(cls, boards):
+        n = len(boards)
+        cols = np.full((n, 8, MAX_HEIGHT), NO_CARD, dtype=np.intp)
+        heights = np.zeros((n, 8), dtype=np.intp)
+        free = np.full((n, 4), NO_CARD, dtype=np.intp)
+        home = np.zeros((n, 4), dtype=np.intp)
+        for i, board in enumerate(boards):
+            for c, column in enumerate(board.columns):
+                cols[i, c, :len(column)] = list(column)
+                heights[i, c] = len(column)
+            free[i, :len(board.free)] = board.free
+            home[i] = board.home
+        return cls(cols, heights, free, home)
+
+    @classmethod
+    def repeat(cls, board, n):
+        one = cls.from_boards([board])
+        return cls(*(np.repeat(array, n, axis=0) for array in (one.cols, one.heights, one.free, one.home)))
+
+    def __len__(self):
+        return len(self.heights)
+
+    def to_board(self, i):
+        columns = tuple(bytes(self.cols[i, c, :self.heights[i, c]].tolist()) for c in range(8))
+        free = tuple(sorted(int(card) for card in self.free[i] if card != NO_CARD))
+        return Board.build(columns, free, tuple(int(height) for height in self.home[i]))
+
+    def tops(self):
+        rows = np.arange(len(self))[:, None]
+        top = self.cols[rows, np.arange(8), np.maximum(self.heights - 1, 0)]
+        return np.where(self.heights > 0, top, NO_CARD)
+
+    def run_lengths(self, tops):
+        # Ordered run at the top of every column, extended one card down per step while any
+        # column still has an alternating descending card underneath
+        rows = np.arange(len(self))[:, None]
+        run = np.minimum(self.heights, 1)
+        below = self.heights - 2
+        upper = tops
+        extending = below >= 0
+        while extending.any():
+            lower = self.cols[rows, np.arange(8), np.maximum(below, 0)]
+            extending &= STACK_T[upper, lower]
+            run += extending
+            upper = lower
+            below -= 1
+            extending &= below >= 0
+        return run
+
+    def legal_mask(self):
+        """
+        Returns (mask, counts): mask (N, slots) marks the legal moves of every board, and
+        counts (N, 8, 8) holds the card count of each sequence_to_column move.
+        Matches Board.legal_moves(), including supermove limits.
+        """
+        n = len(self)
+        rows = np.arange(n)[:, None]
+        heights = self.heights
+        tops = self.tops()
+        empty = heights == 0
+        occupied = ~empty
+        free_empty = self.free == NO_CARD
+        free_cells = free_empty.sum(axis=1)
+        empty_columns = empty.sum(axis=1)
+
+        to_column = empty[:, None, :] | STACK_T[tops[:, :, None], tops[:, None, :]]
+        column_to_column = (occupied[:, :, None] & to_column).reshape(n, 64)[:, _OFF_DIAGONAL]
+        column_to_free = occupied & (free_cells > 0)[:, None]
+        free_to_column = (~free_empty[:, :, None]
+                          & (empty[:, None, :] | STACK_T[self.free[:, :, None], tops[:, None, :]])).reshape(n, 32)
+        column_to_home = self.home[rows, SUIT_T[tops]] + 1 == RANK_T[tops]
+        free_to_home = self.home[rows, SUIT_T[self.free]] + 1 == RANK_T[self.free]
+
+        # Supermoves: onto a card the count is fixed by the ranks; into an empty column
+        # the longest movable run is moved
+        run = self.run_lengths(tops)
+        limit = (free_cells + 1) * 2 ** empty_columns
+        limit_to_empty = (free_cells + 1) * 2 ** np.maximum(empty_columns - 1, 0)
+        onto_card = RANK_T[tops[:, None, :]] - RANK_T[tops[:, :, None]]
+        into_empty = np.minimum(run, limit_to_empty[:, None])[:, :, None]
+        counts = np.where(empty[:, None, :], into_empty, onto_card)
+        bottom = np.clip(heights[:, :, None] - counts, 0, MAX_HEIGHT - 1)
+        moved_bottom = self.cols[rows[:, :, None], np.arange(8)[None, :, None], bottom]
+        sequence = (occupied[:, :, None] & (counts >= 2) & (counts <= run[:, :, None])
+                    & np.where(empty[:, None, :], counts < heights[:, :, None],
+                               (counts <= limit[:, None, None]) & STACK_T[moved_bottom, tops[:, None, :]]))
+        sequence_to_column = sequence.reshape(n, 64)[:, _OFF_DIAGONAL]
+
+        mask = np.concatenate([column_to_column, column_to_free, free_to_column, column_to_home, free_to_home,
+                               sequence_to_column], axis=1)
+        return mask, counts
+
+    def select(self, keep):
+        return BoardBatch(self.cols[keep], self.heights[keep], self.free[keep], self.home[keep])
+
+    def apply(self, choice, counts, active=None):
+        """Plays move slot choice[i] on every board i (only where active[i], if given)."""
+        rows = np.arange(len(self)) if active is None else np.nonzero(active)[0]
+        choice = choice[rows]
+        kind = MOVE_KIND[choice]
+        a = MOVE_A[choice]
+        b = MOVE_B[choice]
+        cols, heights, free, home = self.cols, self.heights, self.free, self.home
+
+        # Column to column, one card or a run: copy the top count cards across
+        sel = (kind == COLUMN_TO_COLUMN) | (kind == SEQUENCE_TO_COLUMN)
+        r, src, dst = rows[sel], a[sel], b[sel]
+        count = np.where(kind[sel] == SEQUENCE_TO_COLUMN, counts[r, src, dst], 1)
+        for k in range(int(count.max()) if len(count) else 0):
+            part = k < count
+            cols[r[part], dst[part], heights[r[part], dst[part]] + k] = \
+                cols[r[part], src[part], heights[r[part], src[part]] - count[part] + k]
+        heights[r, dst] += count
+        heights[r, src] -= count
+
+        sel = kind == COLUMN_TO_FREE
+        r, src = rows[sel], a[sel]
+        slot = np.argmax(free[r] == NO_CARD, axis=1)
+        free[r, slot] = cols[r, src, heights[r, src] - 1]
+        heights[r, src] -= 1
+
+        sel = kind == FREE_TO_COLUMN
+        r, slot, dst = rows[sel], a[sel], b[sel]
+        cols[r, dst, heights[r, dst]] = free[r, slot]
+        heights[r, dst] += 1
+        free[r, slot] = NO_CARD
+
+        sel = kind == COLUMN_TO_HOME
+        r, src = rows[sel], a[sel]
+        home[r, SUIT_T[cols[r, src, heights[r, src] - 1]]] += 1
+        heights[r, src] -= 1
+
+        sel = kind == FREE_TO_HOME
+        r, slot = rows[sel], a[sel]
+        home[r, SUIT_T[free[r, slot]]] += 1
+        free[r, slot] = NO_CARD
+
+    def board_move(self, i, slot, counts):
+        # The move in slot for board i as a Board move tuple (free indices in sorted order)
+        kind, a, b = int(MOVE_KIND[slot]), int(MOVE_A[slot]), int(MOVE_B[slot])
+        if kind in (FREE_TO_COLUMN, FREE_TO_HOME):
+            a = sorted(int(card) for card in self.free[i] if card != NO_CARD).index(int(self.free[i, a]))
+        if kind == SEQUENCE_TO_COLUMN:
+            return (MOVE_NAMES[kind], a, b, int(counts[i, a, b]))
+        if kind in (COLUMN_TO_COLUMN, FREE_TO_COLUMN):
+            return (MOVE_NAMES[kind], a, b)
+        return (MOVE_NAMES[kind], a)
+
+
+def rollouts(board, n, seed, config):
+    """
+    Plays n random rollouts from board at once, home moves first like MCTSNode.rollout,
+    for at most config.rollout_depth moves each. A won rollout scores 1 and one left
+    without moves scores 0; one still running at the depth limit gets the shaped reward
+    (or 0 without config.shaped).
+    Unlike MCTSNode.rollout, moves do not play the safe-to-home closure, provable dead ends
+    do not end a rollout early and positions may repeat, so these rollouts are noisier.
+    Returns (total reward, total moves played).
+    """
+    batch = BoardBatch.repeat(board, n)
+    rng = np.random.default_rng(seed)
+    won = 0  # Rollouts that sent every card home; the ones that got stuck score nothing
+    played = 0
+    for _ in range(config.rollout_depth):
+        mask, counts = batch.legal_mask()
+        home_moves = mask & IS_HOME_MOVE
+        mask = np.where(home_moves.any(axis=1)[:, None], home_moves, mask)
+        # Won and stuck boards drop out, so later steps only work on live ones
+        live = mask.any(axis=1)
+        if not live.all():
+            won += int((batch.home[~live] == 13).all(axis=1).sum())
+            batch = batch.select(live)
+            mask = mask[live]
+            counts = counts[live]
+            if not len(batch):
+                break
+        keys = np.where(mask, rng.random(mask.shape), -1.0)
+        batch.apply(keys.argmax(axis=1), counts)
+        played += len(batch)
+
+    home = batch.home
+    finished = (home == 13).all(axis=1)
+    won += int(finished.sum())
+    reward = float(won)
+    if config.shaped:
+        reward += float((SHAPED_REWARD_CAP * home[~finished].sum(axis=1) / 52).sum())
+    return reward, played
+
+
+def self_check(boards, steps=40, seed=0):
+    """
+    Differential check of the vectorized rules: on every board, for steps random moves,
+    the legal moves must equal Board.legal_moves() and Game.get_possible_moves(), and
+    applying a move must give the same position as Board.play().
+    Raises AssertionError on the first mismatch; returns the number of positions compared.
+    """
+    batch = BoardBatch.from_boards(boards)
+    rng = np.random.default_rng(seed)
+    game = Game(record_history=False)
+    compared = 0
+    active = np.ones(len(batch), dtype=bool)
+    for _ in range(steps):
+        mask, counts = batch.legal_mask()
+        choice = np.where(mask, rng.random(mask.shape), -1.0).argmax(axis=1)
+        expected = []
+        for i in np.nonzero(active)[0]:
+            board = batch.to_board(i)
+            moves = {batch.board_move(i, slot, counts) for slot in np.nonzero(mask[i])[0]}
+            assert moves == set(board.legal_moves()), (board, moves ^ set(board.legal_moves()))
+            game.load_board(board)
+            assert moves == set(game.get_possible_moves()), (board, moves ^ set(game.get_possible_moves()))
+            compared += 1
+            if moves:
+                expected.append((i, board.play(batch.board_move(i, choice[i], counts))))
+            else:
+                active[i] = False
+        batch.apply(choice, counts, active)
+        for i, board in expected:
+            assert batch.to_board(i) == board, (i, batch.to_board(i), board)
+        if not active.any():
+            break
+    return compared